@@ -0,0 +1,37 @@
+""" Settings for ./manage.py benchmark, which throws away its database
+and fills it with a made-up club.  Everything is as in settings.py,
+except that the database is a SQLite file of its own, the cache is in
+memory, and the files the benchmark makes (job exports, pictures,
+stylesheets) go under benchmark_output/, which it also throws away.
+
+    ./manage.py benchmark --settings=bmc.bench_settings
+"""
+
+import os
+
+from bmc.settings import *
+
+DEBUG = False
+TEMPLATE_DEBUG = False
+
+DATABASE_ENGINE = 'sqlite3'
+DATABASE_NAME = os.path.join(os.path.dirname(__file__), 'benchmark.db')
+DATABASE_USER = DATABASE_PASSWORD = DATABASE_HOST = DATABASE_PORT = ''
+
+CACHE_BACKEND = 'locmem://'
+
+BENCHMARK_OUTPUT = os.path.join(os.path.dirname(__file__), 'benchmark_output')
+JOB_OUTPUT_DIR = os.path.join(BENCHMARK_OUTPUT, 'job_output')
+MEDIA_ROOT = os.path.join(BENCHMARK_OUTPUT, 'media')
+CSS_MANIFEST = os.path.join(BENCHMARK_OUTPUT, 'css_manifest.json')
+
+# Only local_settings.py sets this, and the bulk email needs it.
+SERVER_EMAIL = 'benchmark@example.org'
+
+# The benchmark counts queries itself, and profiles recorded in the
+# database would only slow it down.
+MIDDLEWARE_CLASSES = tuple([name for name in MIDDLEWARE_CLASSES
+                            if not name.endswith('.ProfilingMiddleware')])
+
+# manage.py benchmark won't run without this.
+BENCHMARK_DATABASE = True
@@ -5,7 +5,11 @@ from django.contrib import admin
 from django.contrib.auth.models import User, Group
 from django.contrib.auth.admin import UserAdmin
 from bmc.main.models import (Membership, UserProfile, WalkArea, Walk, 
-                             Announcement, Newsbit, IDSession, Page, Due)
+                             Announcement, Newsbit, IDSession, Page, Due,
+                             RequestProfile)
+from bmc.main import suspensions
+from bmc.main.caching import BumpAfterSave
+from django import forms
 from django.utils.translation import ugettext, ugettext_lazy as _
 
 admin.site.unregister(User)
@@ -75,21 +79,24 @@ class MembershipAdmin(admin.ModelAdmin):
         'userprofile__user__first_name',
         'userprofile__user__last_name',
         ]
-    actions = ['toggle_suspend']
-    
-    def toggle_suspend(self, request, queryset):
-        for entry in queryset:
-            profiles = UserProfile.objects.filter(membership=entry.id)
-            if entry.is_active:
-                for profile in profiles:
-                    profile.user.is_active = False
-                    profile.user.save()
-            else:
-                for profile in profiles:
-                    profile.user.is_active = True
-                    profiles.user.save()
-                
-            
+    actions = ['suspend', 'restore']
+
+    def queryset(self, request):
+        # The changelist calls __unicode__ and is_active on every row.
+        qs = super(MembershipAdmin, self).queryset(request)
+        return qs.with_roster()
+
+    def suspend(self, request, queryset):
+        memberships, users = suspensions.suspend(queryset)
+        self.message_user(request, "Suspended %d memberships (%d users)." % (
+                memberships, users))
+    suspend.short_description = "Suspend selected memberships"
+
+    def restore(self, request, queryset):
+        memberships, users = suspensions.restore(queryset)
+        self.message_user(request, "Restored %d memberships (%d users)." % (
+                memberships, users))
+    restore.short_description = "Restore selected memberships"
 
 
 admin.site.register(Membership, MembershipAdmin)
@@ -99,11 +106,27 @@ class DueAdmin(admin.ModelAdmin):
                     'payment_type', 'paid_thru', 'notes')
 admin.site.register(Due, DueAdmin)
 
+class WalkAdminForm(BumpAfterSave, forms.ModelForm):
+    bump_after_save = ('walks',)
+
+    class Meta:
+        model = Walk
+
+class WalkAdmin(admin.ModelAdmin):
+    form = WalkAdminForm
+
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('started', 'method', 'path', 'view', 'status',
+                    'wall_time', 'queries', 'duplicate_queries',
+                    'template_time')
+    list_filter = ('view',)
+admin.site.register(RequestProfile, RequestProfileAdmin)
+
 
 #admin.site.register(Membership)
 #admin.site.register(UserProfile)
 admin.site.register(WalkArea)
-admin.site.register(Walk)
+admin.site.register(Walk, WalkAdmin)
 admin.site.register(Announcement)
 admin.site.register(Newsbit)
 admin.site.register(IDSession)
@@ -1,26 +1,76 @@
+import threading
+
 from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth.models import User
- 
-class EmailOrUsernameModelBackend(object):
-    """ Allows us to login w/ email address or username.   
+from django.core.cache import cache
+from django.utils.hashcompat import md5_constructor
+
+from bmc.main.models import LoginEmail
+
+_local = threading.local()
+
+class ClientAddressMiddleware(object):
+    """ Note the address of the client each thread is answering, for
+    the failed login counts, since authenticate() isn't given the
+    request. """
+
+    def process_request(self, request):
+        _local.address = request.META.get('REMOTE_ADDR', '')
+
+    def process_response(self, request, response):
+        _local.address = ''
+        return response
+
+
+def client_address():
+    """ The address of the client whose request this thread is
+    handling, or '' outside a request. """
+    return getattr(_local, 'address', '')
+
 
+class EmailOrUsernameModelBackend(ModelBackend):
+    """ Allows us to login w/ email address or username.
+
+    Addresses are looked up in the indexed LoginEmail table, and only
+    one user's password is ever checked per attempt.  Failed attempts
+    are counted in the cache for each login and client address, and
+    after LOGIN_FAILURE_LIMIT of them we stop checking passwords for
+    that login from that address for a while.  Someone guessing from
+    elsewhere doesn't lock the member out.
+
+    Permissions come from ModelBackend, which this replaces in
+    AUTHENTICATION_BACKENDS.
     """
     def authenticate(self, username=None, password=None):
+        if not username or password is None:
+            return None
+
+        key = failure_key(username, client_address())
+        failures = cache.get(key, 0)
+        if failures >= settings.LOGIN_FAILURE_LIMIT:
+            return None
+
         if '@' in username:
-            kwargs = {'email': username}
+            user = LoginEmail.objects.candidate(username)
         else:
-            kwargs = {'username': username}
-        
-        users = User.objects.filter(**kwargs)
-        if users:
-            for user in users:
-                if user.check_password(password):
-                    return user
+            try:
+                user = User.objects.get(username=username)
+            except User.DoesNotExist:
+                user = None
+
+        if user is not None and user.check_password(password):
+            if failures:
+                cache.delete(key)
+            return user
 
+        cache.set(key, failures + 1, settings.LOGIN_FAILURE_TIMEOUT)
         return None
 
-    def get_user(self, user_id):
-        try:
-            return User.objects.get(pk=user_id)
-        except User.DoesNotExist:
-            return None
+
+def failure_key(username, address=''):
+    """ Cache key for the failed login count for a username or
+    address, from a client address. """
+    login = username.strip().lower().encode('utf-8')
+    return 'login-failures:%s' % md5_constructor(
+        '%s:%s' % (login, address)).hexdigest()
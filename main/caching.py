@@ -0,0 +1,144 @@
+""" Helpers for caching things that are built from the database.
+
+Rather than hunting down every cache key that a change might affect,
+we keep a generation number for each kind of data (e.g. 'walks'), and
+put it into the keys of everything built from that data.  Bumping the
+generation when the data changes leaves the old entries to expire on
+their own.
+"""
+
+import time
+import datetime
+from django.utils.hashcompat import md5_constructor
+from django.utils.functional import wraps
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.db.models.signals import post_save, post_delete
+
+# Generations are kept for a month.  If one falls out of the cache it
+# restarts from the clock, so it can't land back on an old number.
+GENERATION_TIMEOUT = 60 * 60 * 24 * 30
+
+def generation(name):
+    """ Current generation number for a kind of data. """
+    key = 'generation:%s' % name
+    current = cache.get(key)
+    if current is None:
+        cache.add(key, int(time.time()), GENERATION_TIMEOUT)
+        current = cache.get(key)
+    return current
+
+
+def generations(*names):
+    """ Current generation numbers for several kinds of data, in
+    order, with one trip to the cache. """
+    keys = ['generation:%s' % name for name in names]
+    found = cache.get_many(keys)
+    return [found.get(key) or generation(name)
+            for (name, key) in zip(names, keys)]
+
+
+def bump(name):
+    """ Invalidate everything built from a kind of data. """
+    key = 'generation:%s' % name
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Not in the cache (yet, or anymore); anything cached under
+        # the old generation is unreachable either way.
+        cache.set(key, int(time.time()), GENERATION_TIMEOUT)
+    cache.set('changed:%s' % name, int(time.time()), GENERATION_TIMEOUT)
+
+
+def last_changed(*names):
+    """ When any of the named kinds of data last changed, as a UTC
+    datetime (for Last-Modified).  A time that's fallen out of the
+    cache counts as now. """
+    keys = ['changed:%s' % name for name in names]
+    found = cache.get_many(keys)
+    changed = []
+    for key in keys:
+        when = found.get(key)
+        if when is None:
+            cache.add(key, int(time.time()), GENERATION_TIMEOUT)
+            when = cache.get(key) or int(time.time())
+        changed.append(when)
+    return datetime.datetime.utcfromtimestamp(max(changed))
+
+
+def make_key(name, *parts):
+    """ Cache key for something built from the named data. """
+    return ':'.join(
+        [name, str(generation(name))] + [str(part) for part in parts])
+
+
+def bump_on_change(model, name):
+    """ Bump a generation whenever an instance of model is saved or
+    deleted. """
+    def handler(sender, instance, **kwargs):
+        bump(name)
+    post_save.connect(handler, sender=model, weak=False)
+    post_delete.connect(handler, sender=model, weak=False)
+
+
+class BumpAfterSave(object):
+    """ Mixin for the ModelForms of models whose many to many fields
+    cached things are built from.  bump_on_change's post_save fires
+    before a form saves those, so something cached in between would
+    have the old ones; this bumps the names in bump_after_save again
+    once they're saved. """
+    bump_after_save = ()
+
+    def save(self, commit=True):
+        instance = super(BumpAfterSave, self).save(commit)
+        if commit:
+            self.bump_all()
+        else:
+            save_m2m = self.save_m2m
+            def save_m2m_and_bump():
+                save_m2m()
+                self.bump_all()
+            self.save_m2m = save_m2m_and_bump
+        return instance
+
+    def bump_all(self):
+        for name in self.bump_after_save:
+            bump(name)
+
+
+def cache_public_page(depends_on, timeout):
+    """ Decorator that caches a view's page for anonymous visitors.
+
+    depends_on names the kinds of data the page is built from; the
+    cached page is thrown out when any of them changes.  Pages are
+    also keyed on the date, since most of them show what's coming up.
+    Logged in members, POSTs and query strings always get a fresh page.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method != 'GET' or request.GET or
+                request.user.is_authenticated()):
+                return view(request, *args, **kwargs)
+
+            # 'pages' is for changes to every page, like a new build
+            # of the stylesheets, and every page shows a nugget.
+            parts = [str(number) for number
+                     in generations('pages', 'nuggets', *depends_on)]
+            parts += [str(datetime.date.today()), request.path]
+            key = 'page:%s' % md5_constructor(':'.join(parts)).hexdigest()
+
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, (response.content, response['Content-Type']),
+                          timeout)
+            return response
+
+        return wrapper
+    return decorator
@@ -0,0 +1,211 @@
+""" iCalendar and JSON feeds of upcoming walks and ID sessions.
+
+/calendar.ics (or .json) has what the schedule shows everybody:
+public walks, the posted public walks and ID sessions.
+/calendar/area/<id>.ics has the walks in one walk area, and the ID
+sessions.  Members-only walks are included when the link carries a
+member's key (see member_key); the profile page gives members links
+for their areas.
+
+Feeds are cached until a walk, posted walk or ID session changes (or
+the day ends), and the views answer If-None-Match and
+If-Modified-Since with a 304, so calendar programs can poll often.
+"""
+
+import datetime
+import time
+
+from django.core.cache import cache
+from django.conf import settings
+from django.utils import simplejson
+from django.utils.hashcompat import md5_constructor, sha_constructor
+
+from bmc.main.caching import generations, last_changed
+from bmc.settings import CALENDAR_CACHE_TIMEOUT
+from models import Walk, PublicWalk, IDSession
+
+# What a feed is built from, for its cache key and Last-Modified.
+FEED_DATA = ('walks', 'publicwalks', 'idsessions')
+
+# Walks and sessions have no end time, so we guess.
+WALK_LENGTH = datetime.timedelta(hours=3)
+ID_SESSION_LENGTH = datetime.timedelta(hours=2)
+
+CONTENT_TYPES = {
+    'ics' : 'text/calendar; charset=utf-8',
+    'json' : 'application/json',
+    }
+
+def member_key(user):
+    """ The key that lets a member's calendar program see members-only
+    walks.  It changes with their password. """
+    return sha_constructor('%s:calendar:%s:%s' % (
+            settings.SECRET_KEY, user.id, user.password)).hexdigest()[:20]
+
+
+def upcoming_events(area=None, members=False):
+    """ Events from today on, soonest first, as dicts.  With an area,
+    only its walks (and the ID sessions); members-only walks only if
+    members is set. """
+    today = datetime.date.today()
+    walks = Walk.objects.filter(date__gte=today)
+    if not members:
+        walks = walks.filter(public=True)
+    if area is not None:
+        walks = walks.filter(areas=area)
+
+    events = []
+    for walk in walks.order_by('date', 'time'):
+        start = datetime.datetime.combine(walk.date, walk.time)
+        events.append({
+                'uid' : 'walk-%d' % walk.id,
+                'kind' : 'walk',
+                'title' : 'BMC Walk: %s' % walk.location,
+                'start' : start,
+                'end' : start + WALK_LENGTH,
+                'location' : walk.meeting_place,
+                'description' : '\n\n'.join([text for text in (
+                            walk.directions, walk.terrain, walk.notes)
+                                             if text]),
+                'url' : '/walks/view/%d/' % walk.id,
+                })
+
+    if area is None:
+        for walk in PublicWalk.objects.filter(when__gte=today):
+            events.append({
+                    'uid' : 'publicwalk-%d' % walk.id,
+                    'kind' : 'walk',
+                    'title' : 'BMC Public Walk: %s' % walk.collecting_area,
+                    'start' : walk.when,
+                    'end' : walk.when + WALK_LENGTH,
+                    'location' : walk.meeting_place,
+                    'description' : '',
+                    'url' : '/schedule',
+                    })
+
+    for session in IDSession.objects.filter(when__gte=today):
+        events.append({
+                'uid' : 'idsession-%d' % session.id,
+                'kind' : 'id_session',
+                'title' : 'BMC ID Session',
+                'start' : session.when,
+                'end' : session.when + ID_SESSION_LENGTH,
+                'location' : session.where,
+                'description' : '',
+                'url' : '/schedule',
+                })
+
+    events.sort(key=lambda event: event['start'])
+    return events
+
+
+"""----------------------------------------------------------------
+                             Formats
+----------------------------------------------------------------"""
+
+def ical_text(text):
+    """ Escape text for an iCalendar property. """
+    return (text.replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def ical_line(name, value):
+    """ A property line, folded to 75 octets as RFC 5545 asks. """
+    line = ('%s:%s' % (name, value)).encode('utf-8')
+    parts = []
+    while len(line) > 75:
+        cut = 75
+        # Don't split a UTF-8 character.
+        while cut > 1 and (ord(line[cut]) & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(line[:cut])
+        line = ' ' + line[cut:]
+    parts.append(line)
+    return '\r\n'.join(parts)
+
+
+def ical_time(when):
+    """ Local ("floating") time, which is what the site shows. """
+    return when.strftime('%Y%m%dT%H%M%S')
+
+
+def to_ical(events, name, site):
+    """ The events as an iCalendar file. """
+    stamp = datetime.datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Boston Mycological Club//Schedule//EN',
+        'CALSCALE:GREGORIAN',
+        ical_line('X-WR-CALNAME', ical_text(name)),
+        ]
+    for event in events:
+        lines += [
+            'BEGIN:VEVENT',
+            'UID:%s@%s' % (event['uid'], site),
+            'DTSTAMP:%s' % stamp,
+            'DTSTART:%s' % ical_time(event['start']),
+            'DTEND:%s' % ical_time(event['end']),
+            ical_line('SUMMARY', ical_text(event['title'])),
+            ical_line('LOCATION', ical_text(event['location'])),
+            ]
+        if event['description']:
+            lines.append(ical_line('DESCRIPTION',
+                                   ical_text(event['description'])))
+        lines += [
+            ical_line('URL', 'http://%s%s' % (site, event['url'])),
+            'END:VEVENT',
+            ]
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(lines) + '\r\n'
+
+
+def to_json(events, name, site):
+    """ The events as JSON, with times in ISO 8601. """
+    return simplejson.dumps({
+            'name' : name,
+            'events' : [dict(event,
+                             start=event['start'].isoformat(),
+                             end=event['end'].isoformat(),
+                             url='http://%s%s' % (site, event['url']))
+                        for event in events],
+            })
+
+
+FORMATS = {
+    'ics' : to_ical,
+    'json' : to_json,
+    }
+
+"""----------------------------------------------------------------
+                    Caching and conditional GET
+----------------------------------------------------------------"""
+
+def feed_etag(format, area_id, members):
+    """ The ETag of a feed: it changes whenever what it's built from
+    does, so it can be worked out without building the feed. """
+    parts = [str(number) for number in generations(*FEED_DATA)]
+    parts += [str(datetime.date.today()), format, str(area_id),
+              str(bool(members))]
+    return md5_constructor(':'.join(parts)).hexdigest()
+
+
+def feed_last_modified():
+    """ The last change to anything in a feed, or midnight, when
+    yesterday's events dropped off, whichever is later. """
+    midnight = time.mktime(datetime.date.today().timetuple())
+    return max(last_changed(*FEED_DATA),
+               datetime.datetime.utcfromtimestamp(midnight))
+
+
+def feed(format, name, site, area=None, members=False):
+    """ A feed's content, from the cache if it's there. """
+    parts = generations(*FEED_DATA) + [
+        datetime.date.today(), format, area and area.id, bool(members), site]
+    key = 'calendar:' + ':'.join([str(part) for part in parts])
+    content = cache.get(key)
+    if content is None:
+        events = upcoming_events(area, members)
+        content = FORMATS[format](events, name, site)
+        cache.set(key, content, CALENDAR_CACHE_TIMEOUT)
+    return content
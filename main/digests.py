@@ -0,0 +1,176 @@
+""" Email members about new walks in their areas.
+
+create_digest() finds the walks added since the last digest, and
+works out who hears about which in one pass: the new walks are
+grouped by WalkArea, an index from each of those areas to the members
+who want email about it is built from a single read of the profiles'
+areas, and each member's walks are the union of their areas' walks.
+Members who end up with the same walks share a BulkEmail, so the
+messages are rendered once per set of walks, not once per member.
+
+send_digest() sends all of a digest's emails over one SMTP
+connection.  ./manage.py send_walk_digest does both (queuing the
+sending as a job), and is meant to be run from cron.  The first
+digest covers every upcoming walk.
+"""
+
+import datetime
+
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.core.mail import SMTPConnection
+from django.db import connection, transaction
+from django.template.loader import render_to_string
+
+from bmc.main.mailer import create_bulk_email, send_bulk_email, _close
+from models import Walk, WalkArea, WalkDigest, UserProfile
+
+def m2m_rows(model, field_name, where='', params=()):
+    """ (object id, related id) rows from a many to many table. """
+    field = model._meta.get_field(field_name)
+    qn = connection.ops.quote_name
+    cursor = connection.cursor()
+    cursor.execute('SELECT %s, %s FROM %s %s' % (
+            qn(field.m2m_column_name()),
+            qn(field.m2m_reverse_name()),
+            qn(field.m2m_db_table()),
+            where), params)
+    return cursor.fetchall()
+
+
+def new_walks():
+    """ Upcoming walks added since the last digest, soonest first. """
+    try:
+        since = WalkDigest.objects.all()[0].last_walk
+    except IndexError:
+        since = 0
+    return list(Walk.objects.filter(
+            id__gt=since,
+            date__gte=datetime.date.today(),
+            ).order_by('date', 'time'))
+
+
+def walks_by_area(walks):
+    """ {area id : [walk, ...]} for a list of walks. """
+    by_id = dict((walk.id, walk) for walk in walks)
+    by_area = {}
+    column = Walk._meta.get_field('areas').m2m_column_name()
+    for (walk_id, area_id) in m2m_rows(
+        Walk, 'areas', 'WHERE %s >= %%s' % connection.ops.quote_name(column),
+        [min(by_id.keys())]):
+        if walk_id in by_id:
+            by_area.setdefault(area_id, []).append(by_id[walk_id])
+    return by_area
+
+
+def members_by_area(area_ids):
+    """ {area id : set of user ids} for the members who want email
+    and are interested in the given areas, and {user id : user}. """
+    users = {}
+    profiles = {}
+    for profile in UserProfile.objects.filter(
+        want_email=True, user__is_active=True,
+        ).exclude(user__email='').select_related('user'):
+        profiles[profile.id] = profile.user_id
+        users[profile.user_id] = profile.user
+
+    members = {}
+    column = UserProfile._meta.get_field('areas').m2m_reverse_name()
+    for (profile_id, area_id) in m2m_rows(
+        UserProfile, 'areas', 'WHERE %s IN (%s)' % (
+            connection.ops.quote_name(column),
+            ', '.join(['%s'] * len(area_ids))), list(area_ids)):
+        if profile_id in profiles:
+            members.setdefault(area_id, set()).add(profiles[profile_id])
+    return members, users
+
+
+def digest_groups(walks, by_area):
+    """ [(walks, users)]: each set of walks that someone should hear
+    about, and everyone who should hear about exactly those.  by_area
+    is from walks_by_area. """
+    if not by_area:
+        return []
+    members, users = members_by_area(by_area.keys())
+
+    member_walks = {}
+    for (area_id, user_ids) in members.items():
+        for user_id in user_ids:
+            member_walks.setdefault(user_id, set()).update(
+                [walk.id for walk in by_area[area_id]])
+
+    groups = {}
+    for (user_id, walk_ids) in member_walks.items():
+        groups.setdefault(tuple(sorted(walk_ids)), []).append(users[user_id])
+
+    by_id = dict((walk.id, walk) for walk in walks)
+    return [([by_id[walk_id] for walk_id in walk_ids], recipients)
+            for (walk_ids, recipients) in groups.items()
+            if recipients]
+
+
+def digest_message(walks, areas, site):
+    """ The subject and text of an email about some walks. """
+    if len(walks) == 1:
+        subject = 'A new BMC walk in your area'
+    else:
+        subject = '%d new BMC walks in your areas' % len(walks)
+    walks = [(walk, [areas[area_id] for area_id in walk.area_ids])
+             for walk in sorted(walks, key=lambda walk: (walk.date,
+                                                         walk.time))]
+    message = render_to_string('walk_digest.txt', {
+            'walks' : walks,
+            'site' : site,
+            })
+    return subject, message
+
+
+@transaction.commit_on_success
+def create_digest():
+    """ Record a digest of the new walks, with its emails ready to
+    send.  Returns the WalkDigest, or None if there are no new
+    walks. """
+    walks = new_walks()
+    if not walks:
+        return None
+
+    by_area = walks_by_area(walks)
+    area_ids = {}
+    for (area_id, area_walks) in by_area.items():
+        for walk in area_walks:
+            area_ids.setdefault(walk.id, []).append(area_id)
+    for walk in walks:
+        walk.area_ids = area_ids.get(walk.id, [])
+    areas = dict((area.id, area) for area in WalkArea.objects.all())
+    site = Site.objects.get_current().domain
+
+    digest = WalkDigest.objects.create(
+        last_walk=max([walk.id for walk in walks]),
+        walk_count=len(walks),
+        )
+    for (group_walks, users) in digest_groups(walks, by_area):
+        subject, message = digest_message(group_walks, areas, site)
+        digest.bulk_emails.add(
+            create_bulk_email(subject, message, settings.SERVER_EMAIL,
+                              users))
+    return digest
+
+
+def send_digest(digest, progress=None):
+    """ Send a digest's emails (whatever hasn't been sent), all over
+    one SMTP connection.  Returns (sent, failed) counts; progress is
+    called with the running totals, as for send_bulk_email. """
+    sent = failed = 0
+    smtp = SMTPConnection()
+    try:
+        for bulk_email in digest.bulk_emails.all():
+            def report(batch_sent, batch_failed):
+                if progress:
+                    progress(sent + batch_sent, failed + batch_failed)
+            email_sent, email_failed = send_bulk_email(
+                bulk_email, progress=report, connection=smtp)
+            sent += email_sent
+            failed += email_failed
+    finally:
+        _close(smtp)
+    return sent, failed
@@ -4,10 +4,14 @@ from django.forms import (ModelForm, Form, TextInput, DateField,
                           TimeField, BooleanField, CharField,
                           Textarea, IntegerField, EmailField)
 from kungfutime import KungfuTimeField
+from bmc.main.caching import BumpAfterSave
 
 # Walk Editing Forms
 
-class WalkForm(ModelForm):
+class WalkForm(BumpAfterSave, ModelForm):
+    # The cached walk lists go by area.
+    bump_after_save = ('walks',)
+
     time = KungfuTimeField()
     permission = BooleanField(
         required=True,
@@ -46,7 +50,9 @@ class MembershipFetch(Form):
     membership_id = IntegerField()
 
 class MembershipSearch(Form):
-    last_name = CharField(max_length=30)
+    # Still called last_name for old links and bookmarks, but it
+    # searches names, emails, addresses and membership ids.
+    last_name = CharField(max_length=100, label='Name, email or address')
         
 class UserForm(ModelForm):
     """ Form to create a new user via the mushroom_admin.  
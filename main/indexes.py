@@ -0,0 +1,124 @@
+""" Indexes for the columns the busy pages filter and sort on.
+
+Django can only index one column at a time (db_index), and syncdb
+never touches a table that already exists, so the indexes are listed
+here instead.  syncdb creates any that are missing (see
+main/management/__init__.py), and so does ./manage.py add_indexes,
+which also shows how the database plans the queries they're for.
+
+Each index is created only if there isn't one of that name already,
+so both are safe to run again.
+"""
+
+import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.backends.util import truncate_name
+
+from models import (Membership, Due, Walk, Newsbit, PublicWalk,
+                    IDSession)
+
+# (model, columns), matching the queries in HOT_QUERIES.
+INDEXES = (
+    # The schedule: upcoming public walks.
+    (Walk, ('public', 'date')),
+    # Upcoming walks, soonest first, and the paged walk list.
+    (Walk, ('date', 'time')),
+    # A membership's dues, latest paid_thru first.
+    (Due, ('membership_id', 'paid_thru')),
+    # The payment history, and dues paid in a year.
+    (Due, ('payment_date',)),
+    # The paged membership list.
+    (Membership, ('join_date',)),
+    (Newsbit, ('timestamp',)),
+    (PublicWalk, ('when',)),
+    (IDSession, ('when',)),
+    )
+
+def hot_queries():
+    """ (description, queryset) for the queries the indexes are for,
+    as the views make them. """
+    today = datetime.date.today()
+    return (
+        ('schedule: public walks',
+         Walk.objects.filter(public=True, date__gte=today)),
+        ('upcoming walks', Walk.objects.upcoming()),
+        ('walk list', Walk.objects.order_by('-date', '-id')[:25]),
+        ('a membership\'s dues', Due.objects.filter(membership=1)),
+        ('payment history', Due.objects.order_by('-payment_date')[:25]),
+        ('dues paid this year', Due.objects.filter(
+                payment_date__gte=datetime.date(today.year, 1, 1),
+                payment_date__lt=datetime.date(today.year + 1, 1, 1))),
+        ('membership list',
+         Membership.objects.order_by('-join_date', '-id')[:25]),
+        ('newsbits', Newsbit.objects.all()[:3]),
+        ('public walks', PublicWalk.objects.filter(when__gte=today)),
+        ('ID sessions', IDSession.objects.filter(when__gte=today)),
+        )
+
+
+def index_name(model, columns):
+    return truncate_name('%s_%s' % (model._meta.db_table, '_'.join(columns)),
+                         connection.ops.max_name_length())
+
+
+def existing_indexes(cursor, table):
+    """ The names of the indexes on a table.  Django 1.1's
+    introspection only knows about single column indexes, so we ask
+    the database ourselves. """
+    engine = settings.DATABASE_ENGINE
+    if engine == 'sqlite3':
+        cursor.execute("SELECT name FROM sqlite_master "
+                       "WHERE type = 'index' AND tbl_name = %s", [table])
+        return set([row[0] for row in cursor.fetchall()])
+    if engine.startswith('postgresql'):
+        cursor.execute("SELECT indexname FROM pg_indexes "
+                       "WHERE tablename = %s", [table])
+        return set([row[0] for row in cursor.fetchall()])
+    if engine == 'mysql':
+        cursor.execute("SHOW INDEX FROM %s" % connection.ops.quote_name(table))
+        return set([row[2] for row in cursor.fetchall()])
+    raise NotImplementedError("Can't list indexes on %s" % engine)
+
+
+def missing_indexes():
+    """ (name, model, columns) for each index that hasn't been made. """
+    cursor = connection.cursor()
+    existing = {}
+    missing = []
+    for (model, columns) in INDEXES:
+        table = model._meta.db_table
+        if table not in existing:
+            existing[table] = existing_indexes(cursor, table)
+        name = index_name(model, columns)
+        if name not in existing[table]:
+            missing.append((name, model, columns))
+    return missing
+
+
+@transaction.commit_on_success
+def create_indexes():
+    """ Create the missing indexes.  Returns their names. """
+    qn = connection.ops.quote_name
+    cursor = connection.cursor()
+    created = []
+    for (name, model, columns) in missing_indexes():
+        cursor.execute('CREATE INDEX %s ON %s (%s)' % (
+                qn(name), qn(model._meta.db_table),
+                ', '.join([qn(column) for column in columns])))
+        created.append(name)
+    return created
+
+
+def explain(queryset):
+    """ The database's plan for a queryset, as lines of text. """
+    sql, params = queryset.query.as_sql()
+    if settings.DATABASE_ENGINE == 'sqlite3':
+        sql = 'EXPLAIN QUERY PLAN ' + sql
+    else:
+        sql = 'EXPLAIN ' + sql
+    cursor = connection.cursor()
+    cursor.execute(sql, params)
+    return [' '.join([unicode(column) for column in row])
+            for row in cursor.fetchall()]
@@ -0,0 +1,209 @@
+""" A small database-backed job queue.
+
+Views call enqueue() and send the user to the job's status page;
+./manage.py run_jobs picks the jobs up and does the work out of band.
+A job's kind names one of the handlers registered below with
+@handler.  Each handler gets the Job and its arguments, may report
+progress with set_progress, and returns a message for the status page.
+"""
+
+import datetime
+import os
+import traceback
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import simplejson
+
+from bmc.settings import JOB_TIMEOUT
+from models import Job, Announcement, BulkEmail, Membership, WalkDigest
+
+HANDLERS = {}
+
+def handler(kind):
+    """ Register a function to run jobs of the given kind. """
+    def register(function):
+        HANDLERS[kind] = function
+        return function
+    return register
+
+
+def enqueue(kind, user=None, **arguments):
+    """ Queue up a job, and return it. """
+    if kind not in HANDLERS:
+        raise ValueError("Unknown job kind: %s" % kind)
+    if user is not None and not user.is_authenticated():
+        user = None
+    return Job.objects.create(
+        kind=kind,
+        created_by=user,
+        arguments=simplejson.dumps(arguments),
+        )
+
+
+def job_url(job):
+    return '/jobs/%s/' % job.id
+
+
+def set_progress(job, progress, total=None):
+    """ Record how far along a job is, without saving the rest of the
+    row. """
+    job.progress = progress
+    updates = { 'progress' : progress }
+    if total is not None:
+        job.total = total
+        updates['total'] = total
+    Job.objects.filter(id=job.id).update(**updates)
+
+
+def reap_stale(timeout=None):
+    """ Mark jobs that have been running for more than timeout (or
+    JOB_TIMEOUT) seconds as failed: their worker died, or was killed,
+    without finishing them.  Returns how many there were. """
+    if timeout is None:
+        timeout = JOB_TIMEOUT
+    now = datetime.datetime.now()
+    return Job.objects.filter(
+        status='running',
+        started__lt=now - datetime.timedelta(seconds=timeout),
+        ).update(
+        status='failed',
+        finished=now,
+        message='Gave up after %d seconds; the worker running it died.' % (
+            timeout),
+        )
+
+
+def claim_next():
+    """ Mark the oldest queued job as running and return it, or return
+    None if there's nothing to do.  Safe to run from several workers:
+    only one of them will manage to claim each job.  Jobs whose worker
+    died are reaped first. """
+    reap_stale()
+    for job in Job.objects.filter(status='queued').order_by('created', 'id'):
+        now = datetime.datetime.now()
+        claimed = Job.objects.filter(id=job.id, status='queued').update(
+            status='running', started=now)
+        if claimed:
+            job.status = 'running'
+            job.started = now
+            return job
+    return None
+
+
+def run(job):
+    """ Run a claimed job, recording how it turned out. """
+    try:
+        message = HANDLERS[job.kind](job, **job.get_arguments())
+    except Exception:
+        transaction.rollback_unless_managed()
+        status = 'failed'
+        message = traceback.format_exc()
+    else:
+        status = 'done'
+
+    job.status = status
+    job.message = message or ''
+    job.finished = datetime.datetime.now()
+    Job.objects.filter(id=job.id).update(
+        status=job.status,
+        message=job.message,
+        output=job.output,
+        finished=job.finished,
+        )
+    return job
+
+
+def output_path(job):
+    return os.path.join(settings.JOB_OUTPUT_DIR, job.output)
+
+
+def write_output(job, name, lines, total=None):
+    """ Write a generated file for a job, reporting progress every
+    hundred lines. """
+    if not os.path.isdir(settings.JOB_OUTPUT_DIR):
+        os.makedirs(settings.JOB_OUTPUT_DIR)
+
+    job.output = 'job%d-%s' % (job.id, name)
+    set_progress(job, 0, total)
+    out = open(output_path(job), 'w')
+    try:
+        written = 0
+        for line in lines:
+            out.write(line)
+            written += 1
+            if written % 100 == 0:
+                set_progress(job, written)
+    finally:
+        out.close()
+    set_progress(job, written)
+
+
+"""----------------------------------------------------------------
+                         Handlers
+----------------------------------------------------------------"""
+
+@handler('send_email')
+def send_email_job(job, bulk_email, retry=False):
+    from bmc.main.mailer import send_bulk_email
+
+    bulk_email = BulkEmail.objects.get(id=bulk_email)
+    total = bulk_email.unsent_count()
+    set_progress(job, 0, total)
+
+    sent, failed = send_bulk_email(
+        bulk_email, retry=retry,
+        progress=lambda sent, failed: set_progress(job, sent + failed))
+    return "Sent %d messages, %d failed." % (sent, failed)
+
+
+@handler('walk_digest')
+def walk_digest_job(job, digest):
+    from bmc.main.digests import send_digest
+
+    digest = WalkDigest.objects.get(id=digest)
+    set_progress(job, 0, digest.unsent_count())
+
+    sent, failed = send_digest(
+        digest,
+        progress=lambda sent, failed: set_progress(job, sent + failed))
+    return "Sent %d walk digests, %d failed." % (sent, failed)
+
+
+@handler('announcement_picture')
+def announcement_picture_job(job, announcement):
+    from bmc.main.pictures import refresh_picture
+
+    try:
+        announcement = Announcement.objects.get(id=announcement)
+    except Announcement.DoesNotExist:
+        return "The announcement has been deleted."
+    info = refresh_picture(announcement)
+    if not announcement.picture:
+        return "The announcement has no picture."
+    if info is None:
+        return "Couldn't make copies of %s." % announcement.picture.name
+    return "Pictures are ready."
+
+
+@handler('membership_report')
+def membership_report_job(job, filter_by='active'):
+    from bmc.reports.views import filter_memberships
+    from bmc.reports.export import membership_report_lines
+
+    memberships = filter_memberships(filter_by)
+    write_output(job, 'memberships-%s.csv' % filter_by.replace('+', '-'),
+                 membership_report_lines(memberships),
+                 memberships.count() + 1)
+    return "Membership report is ready."
+
+
+@handler('mailing_labels')
+def mailing_labels_job(job):
+    from bmc.reports.export import mailing_label_lines
+
+    memberships = Membership.objects.filter(standing__active=True)
+    write_output(job, 'mailing_labels.csv',
+                 mailing_label_lines(memberships),
+                 memberships.count() + 1)
+    return "Mailing labels are ready."
@@ -1,226 +1,372 @@
-# Author: Michael DiBernardo (mikedebo@gmail.com)
-from django import forms
-from django.forms import ValidationError
-
-import datetime
-import re
-
-class KungfuTimeField(forms.Field):
-    """
-    Extension to Django's time fields that parses a much larger range of times
-    without explicitly needing to specify all the time formats yourself.
-    """
-
-    # Matches any string with a 24-hourish format (sans AM/PM) but puts no
-    # limits on the size of the numbers (e.g. 64:99 is OK.)
-    _24_HOUR_PATTERN_STRING = r'^\s*(?P<hour>\d\d?)\s*:?\s*(?P<minute>\d\d)?\s*(:?\s*(?P<second>\d\d)\s*)?'
-
-    # Matches any string with a 12-hourish format (with AM/PM) but puts no
-    # limits on the size of the numbers (e.g. 64:99pm is OK.)
-    _TIME_PATTERN_STRING = _24_HOUR_PATTERN_STRING + \
-        r'((?P<ampm>[AaPp])\s*\.?\s*[Mm]?\s*\.?\s*)?$'
-
-    # Matcher for our time pattern.
-    _TIME_PATTERN = re.compile(_TIME_PATTERN_STRING)
-
-    # Validation error messages.
-    _ERROR_MESSAGES = {
-        'invalid' : u'Enter a valid time.',
-    }
-
-    def __init__(self, *args, **kwargs):
-        """
-        Create a new KungFuTimeField with the mojo of a thousand TimeFields.
-        """
-        super(KungfuTimeField, self).__init__(*args, **kwargs)
-
-    def clean(self, value):
-        """
-        Parses datetime from the given value. If it can't figure it out, throws
-        a ValidationError.
-        """
-        super(KungfuTimeField, self).clean(value)
-        if not value:
-            return None
-        if isinstance(value, datetime.time):
-            return value
-        cleaned = self._parse_time(value)
-        return cleaned
-
-    def _parse_time(self, value):
-        """
-        Tries to recognize a time using our hefty regexp. If it doesn't match
-        the regexp, throws a validation error. If it DOES match but the
-        resulting numbers are out of range (e.g. an hour of 99), will also
-        throw a ValidationError.
-        """
-        match = self._TIME_PATTERN.match(value)
-        if not match:
-            raise ValidationError(self._ERROR_MESSAGES['invalid'])
-
-        # Hour has to be there because it's required in the regexp. Set the
-        # minute to 0 for now. We dunno if there's AM/PM or not.
-        (hour, minute, second, ampm) = (int(match.group('hour')), 
-                                        0, 0, match.group('ampm'))
-
-        # Let's see if the user typed a minute ...
-        try:
-            # Raises TypeError if group fetch returns None.
-            minute = int(match.group('minute'))
-        except TypeError:
-            pass  
-
-        # ... or a second.
-        try:
-            # Raises TypeError if group fetch returns None.
-            second = int(match.group('second'))
-        except TypeError:
-            pass  
-
-        if ampm:
-            hour = self._handle_twelve_hour_time(hour, minute, second, ampm)
-
-        # If the numbers are out of range, we'll find out here.
-        try:
-            return datetime.time(hour, minute, second)
-        except ValueError:
-            raise ValidationError(self._ERROR_MESSAGES['invalid'])
-
-        # I don't expect any other problems, but if there are, they'll
-        # propagate.
-
-    def _handle_twelve_hour_time(self, hour, minute, second, ampm):
-        """
-        Detect 24 hour time with an am/pm (e.g. 18:30:00pm, 0:30:00am)
-        and do the necessary transform for converting pm times to 24
-        hour times.
-        """
-        if hour < 1 or hour > 12:
-            raise ValidationError(self._ERROR_MESSAGES['invalid'])
-        elif ampm.lower() == "a" and hour == 12:
-            return 0
-        elif ampm.lower() == "p" and 1 <= hour and hour <= 11:
-            return hour + 12
-        else:
-            return hour
-
-"""
-Tests that our extension to the Django time field can parse a wide variety of
-time formats.
-"""
-
-# Author: Michael DiBernardo (mikedebo@gmail.com)
-from kungfutime import KungfuTimeField
-from django.forms import ValidationError
-
-import datetime as dt
-import unittest
-
-class TestTimeParsing(unittest.TestCase):
-
-    def setUp(self):
-        self.field = KungfuTimeField()
-
-    def test24HourFormats(self):
-        """
-        Tests a variety of 24 hour formats.
-        """
-        twofour_hour_tests = (
-            ("8:30", dt.time(8, 30)),
-            ("14:30", dt.time(14, 30)),
-            ("8", dt.time(8)),
-            ("16", dt.time(16)),
-            ("1742", dt.time(17, 42)),
-            ("856", dt.time(8, 56)),
-            ("101", dt.time(1, 01)),
-            ("1 01", dt.time(1, 01)),
-            ("13 01", dt.time(13, 01)),
-            ("01 01", dt.time(1, 1)),
-            (" 13     01 ", dt.time(13, 01)),
-        )
-
-        for (input, expected) in twofour_hour_tests:
-            self.assertTimeEquals(input, expected)
-
-    def test12HourFormats(self):
-        """
-        Tests a variety of 12 hour formats.
-        """
-        twelve_hour_tests = (
-            ("12:30pm", dt.time(12, 30)),
-            ("12:30PM", dt.time(12, 30)),
-            ("12:30P.m.", dt.time(12, 30)),
-            ("12:30 pm  ", dt.time(12, 30)),
-            ("12:30 P m", dt.time(12, 30)),
-            ("12:30 p .  M  .", dt.time(12, 30)),
-            ("12:30p", dt.time(12, 30)),
-            ("12:30  p", dt.time(12, 30)),
-            ("12 30pm", dt.time(12, 30)),
-            ("12  30 pm", dt.time(12, 30)),
-            ("1230 p m", dt.time(12, 30)),
-            ("  1230 p m", dt.time(12, 30)),
-            ("12  30 p .  m  .", dt.time(12, 30)),
-            ("1:30am", dt.time(1, 30)),
-            ("1:30 am  ", dt.time(1, 30)),
-            ("1:30 a m", dt.time(1, 30)),
-            ("1:30 a .  m  .", dt.time(1, 30)),
-            ("1:30a", dt.time(1, 30)),
-            ("1:30  a", dt.time(1, 30)),
-            ("1 30am", dt.time(1, 30)),
-            ("  1  30 am", dt.time(1, 30)),
-            ("130 a m", dt.time(1, 30)),
-            ("3:30 p m", dt.time(15, 30)),
-            ("     1  30 a .  m  ", dt.time(1, 30)),
-        )
-
-        for (input, expected) in twelve_hour_tests:
-            self.assertTimeEquals(input, expected)
-
-    def testBadTimes(self):
-        """
-        Tests a variety of times that should bork and die, not necessarily in
-        that order.
-        """
-        bad_inputs = (
-            "",
-            " aa ",
-            "12345",
-            "1340am",
-            "030pm",
-            "25:23",
-            "24:10",
-            "this ain't nothing like a time",
-            "-2:30",
-        )
-
-        for bad_input in bad_inputs:
-            try:
-                self.field.clean(bad_input)
-                self.fail("Bad input %s validated." % bad_input)
-            except AssertionError, e:
-                raise e
-            except ValidationError, e:
-                pass
-            except Exception, e:
-                self.fail("Validator threw unexpected exception %s" % str(e))
-
-    def assertTimeEquals(self, timestring, expected):
-        """
-        Try to parse a time, and if it throws an exception, fail.
-        """
-        try:
-            actual = self.field.clean(timestring)
-            self.assertEquals(actual, expected,
-                    "String %s did not parse to expected datetime %s: Got %s" %
-                    (timestring, str(expected), str(actual))
-            )
-        except AssertionError, e:
-            # Propagate assertion failures.
-            raise e
-        except ValidationError, e:
-            self.fail("String %s did not validate." % timestring)
-        except Exception, e:
-            self.fail("String %s caused unexpected exception: %s" %
-                    (timestring, str(e)))
-
-
+# Author: Michael DiBernardo (mikedebo@gmail.com)
+from django import forms
+from django.forms import ValidationError
+
+import datetime
+import itertools
+import re
+
+# What the old regexp's \s and \d matched (it wasn't compiled with
+# re.UNICODE, so only ASCII counts).
+_WHITESPACE = re.compile(r'\s+')
+_DIGITS = '0123456789'
+
+# Everything that can follow the a or p of an am/pm, once whitespace
+# is squeezed out.
+_AMPM_ENDINGS = frozenset(['', '.', 'm', 'M', '.m', '.M', 'm.', 'M.',
+                           '.m.', '.M.', '..'])
+
+# The longest thing we accept, not counting whitespace: "12:30:45p.m."
+_MAX_CHARS = 12
+
+# How many distinct inputs to remember.  When the cache fills up, the
+# least recently used quarter of it is thrown out.
+_CACHE_SIZE = 256
+_cache = {}
+_clock = itertools.count()
+
+def parse_time(value):
+    """
+    Parses a time string the way KungfuTimeField does, returning a
+    datetime.time, or None if it isn't a time.
+
+    Results are cached under the input with its whitespace squeezed
+    down to single spaces, so the few spellings of walk start times
+    that people actually type are only worked out once.  Anything too
+    long to be a time is turned away before it gets that far.
+    """
+    key = _normalize(value)
+    if key is None:
+        return None
+
+    try:
+        result, last_used = _cache[key]
+    except KeyError:
+        result = _parse_normalized(key)
+        if len(_cache) >= _CACHE_SIZE:
+            _forget_oldest()
+    _cache[key] = (result, _clock.next())
+    return result
+
+
+def parse_times(values):
+    """
+    Parses a whole list of time strings at once (e.g. a season's walk
+    schedule), returning a list of datetime.times, with None for each
+    one that isn't a time.  Each distinct spelling is only parsed
+    once, and the batch doesn't push everything else out of the cache.
+    """
+    parsed = {}
+    for value in values:
+        if value not in parsed:
+            key = _normalize(value)
+            if key is None:
+                parsed[value] = None
+            elif key in _cache:
+                parsed[value] = parse_time(value)
+            else:
+                parsed[value] = _parse_normalized(key)
+    return [parsed[value] for value in values]
+
+
+def _normalize(value):
+    """ Squeeze a time string's whitespace down to single spaces, or
+    return None if it's too long to be a time. """
+    words = [word for word in _WHITESPACE.split(value) if word]
+    if len(words) > _MAX_CHARS or sum(map(len, words)) > _MAX_CHARS:
+        return None
+    return ' '.join(words)
+
+
+def _forget_oldest():
+    """ Throw out the least recently used quarter of the cache. """
+    by_age = sorted([(last_used, key) for (key, (result, last_used))
+                     in _cache.items()])
+    for (last_used, key) in by_age[:_CACHE_SIZE // 4]:
+        # Another thread may have beaten us to it.
+        _cache.pop(key, None)
+
+
+def _parse_normalized(value):
+    """
+    Parses a time from a string whose whitespace has been squeezed
+    down to single spaces.  Whitespace can go between any two parts
+    of a time, but can't split up a two-digit number.
+
+    This accepts the same strings as KungfuTimeField._TIME_PATTERN,
+    and where a string can be read more than one way (is "856" 8:56
+    or 85:6?), tries the readings in the same order the regexp would.
+    There are never more than a few dozen readings to try.
+    """
+    # chars[i] is the i'th non-space; joined[i] says whether it came
+    # right after chars[i - 1], with no space between them.
+    chars = []
+    joined = []
+    for word in value.split(' '):
+        chars.extend(word)
+        joined.append(False)
+        joined.extend([True] * (len(word) - 1))
+
+    # The time is everything up to the first letter (or other
+    # non-digit, non-colon); the rest has to be an am/pm.
+    split = 0
+    while split < len(chars) and (chars[split] in _DIGITS or
+                                   chars[split] == ':'):
+        split += 1
+    ampm = None
+    if split < len(chars):
+        if (chars[split] not in 'AaPp' or
+            ''.join(chars[split + 1:]) not in _AMPM_ENDINGS):
+            return None
+        ampm = chars[split].lower()
+
+    def number(start, length):
+        # The number at start, if there is one of that length.
+        end = start + length
+        if end > split:
+            return None
+        for i in range(start, end):
+            if chars[i] not in _DIGITS or (i > start and not joined[i]):
+                return None
+        return int(''.join(chars[start:end]))
+
+    def colon(start):
+        # Where we might carry on from, after an optional colon.
+        if start < split and chars[start] == ':':
+            return (start + 1, start)
+        return (start,)
+
+    for hour_length in (2, 1):
+        hour = number(0, hour_length)
+        if hour is None:
+            continue
+        for after_colon in colon(hour_length):
+            for minute_length in (2, 0):
+                minute = 0
+                if minute_length:
+                    minute = number(after_colon, 2)
+                    if minute is None:
+                        continue
+                after_minute = after_colon + minute_length
+                # A second, with an optional colon before it, or not.
+                readings = [(at, 2) for at in colon(after_minute)]
+                readings.append((after_minute, 0))
+                for (at, second_length) in readings:
+                    second = 0
+                    if second_length:
+                        second = number(at, 2)
+                        if second is None:
+                            continue
+                    if at + second_length == split:
+                        return _make_time(hour, minute, second, ampm)
+    return None
+
+
+def _make_time(hour, minute, second, ampm):
+    """
+    Detect 24 hour time with an am/pm (e.g. 18:30:00pm, 0:30:00am),
+    do the necessary transform for converting pm times to 24 hour
+    times, and build the time; None if the numbers are out of range.
+    """
+    if ampm:
+        if hour < 1 or hour > 12:
+            return None
+        elif ampm == "a" and hour == 12:
+            hour = 0
+        elif ampm == "p" and hour != 12:
+            hour += 12
+    try:
+        return datetime.time(hour, minute, second)
+    except ValueError:
+        return None
+
+
+class KungfuTimeField(forms.Field):
+    """
+    Extension to Django's time fields that parses a much larger range of times
+    without explicitly needing to specify all the time formats yourself.
+    """
+
+    # The grammar we accept, as a regexp.  Parsing is done by
+    # parse_time above, which takes time proportional to the input
+    # (this regexp backtracks badly on long runs of whitespace); it's
+    # kept for reference and for kungfutime_benchmark.py.
+
+    # Matches any string with a 24-hourish format (sans AM/PM) but puts no
+    # limits on the size of the numbers (e.g. 64:99 is OK.)
+    _24_HOUR_PATTERN_STRING = r'^\s*(?P<hour>\d\d?)\s*:?\s*(?P<minute>\d\d)?\s*(:?\s*(?P<second>\d\d)\s*)?'
+
+    # Matches any string with a 12-hourish format (with AM/PM) but puts no
+    # limits on the size of the numbers (e.g. 64:99pm is OK.)
+    _TIME_PATTERN_STRING = _24_HOUR_PATTERN_STRING + \
+        r'((?P<ampm>[AaPp])\s*\.?\s*[Mm]?\s*\.?\s*)?$'
+
+    # Matcher for our time pattern.
+    _TIME_PATTERN = re.compile(_TIME_PATTERN_STRING)
+
+    # Validation error messages.
+    _ERROR_MESSAGES = {
+        'invalid' : u'Enter a valid time.',
+    }
+
+    def __init__(self, *args, **kwargs):
+        """
+        Create a new KungFuTimeField with the mojo of a thousand TimeFields.
+        """
+        super(KungfuTimeField, self).__init__(*args, **kwargs)
+
+    def clean(self, value):
+        """
+        Parses datetime from the given value. If it can't figure it out, throws
+        a ValidationError.
+        """
+        super(KungfuTimeField, self).clean(value)
+        if not value:
+            return None
+        if isinstance(value, datetime.time):
+            return value
+        cleaned = self._parse_time(value)
+        return cleaned
+
+    def _parse_time(self, value):
+        """
+        Tries to recognize a time. If it isn't shaped like one, or the
+        numbers are out of range (e.g. an hour of 99), throws a
+        ValidationError.
+        """
+        cleaned = parse_time(value)
+        if cleaned is None:
+            raise ValidationError(self._ERROR_MESSAGES['invalid'])
+        return cleaned
+
+"""
+Tests that our extension to the Django time field can parse a wide variety of
+time formats.
+"""
+
+# Author: Michael DiBernardo (mikedebo@gmail.com)
+from kungfutime import KungfuTimeField
+from django.forms import ValidationError
+
+import datetime as dt
+import unittest
+
+class TestTimeParsing(unittest.TestCase):
+
+    def setUp(self):
+        self.field = KungfuTimeField()
+
+    def test24HourFormats(self):
+        """
+        Tests a variety of 24 hour formats.
+        """
+        twofour_hour_tests = (
+            ("8:30", dt.time(8, 30)),
+            ("14:30", dt.time(14, 30)),
+            ("8", dt.time(8)),
+            ("16", dt.time(16)),
+            ("1742", dt.time(17, 42)),
+            ("856", dt.time(8, 56)),
+            ("101", dt.time(1, 01)),
+            ("1 01", dt.time(1, 01)),
+            ("13 01", dt.time(13, 01)),
+            ("01 01", dt.time(1, 1)),
+            (" 13     01 ", dt.time(13, 01)),
+        )
+
+        for (input, expected) in twofour_hour_tests:
+            self.assertTimeEquals(input, expected)
+
+    def test12HourFormats(self):
+        """
+        Tests a variety of 12 hour formats.
+        """
+        twelve_hour_tests = (
+            ("12:30pm", dt.time(12, 30)),
+            ("12:30PM", dt.time(12, 30)),
+            ("12:30P.m.", dt.time(12, 30)),
+            ("12:30 pm  ", dt.time(12, 30)),
+            ("12:30 P m", dt.time(12, 30)),
+            ("12:30 p .  M  .", dt.time(12, 30)),
+            ("12:30p", dt.time(12, 30)),
+            ("12:30  p", dt.time(12, 30)),
+            ("12 30pm", dt.time(12, 30)),
+            ("12  30 pm", dt.time(12, 30)),
+            ("1230 p m", dt.time(12, 30)),
+            ("  1230 p m", dt.time(12, 30)),
+            ("12  30 p .  m  .", dt.time(12, 30)),
+            ("1:30am", dt.time(1, 30)),
+            ("1:30 am  ", dt.time(1, 30)),
+            ("1:30 a m", dt.time(1, 30)),
+            ("1:30 a .  m  .", dt.time(1, 30)),
+            ("1:30a", dt.time(1, 30)),
+            ("1:30  a", dt.time(1, 30)),
+            ("1 30am", dt.time(1, 30)),
+            ("  1  30 am", dt.time(1, 30)),
+            ("130 a m", dt.time(1, 30)),
+            ("3:30 p m", dt.time(15, 30)),
+            ("     1  30 a .  m  ", dt.time(1, 30)),
+        )
+
+        for (input, expected) in twelve_hour_tests:
+            self.assertTimeEquals(input, expected)
+
+    def testBadTimes(self):
+        """
+        Tests a variety of times that should bork and die, not necessarily in
+        that order.
+        """
+        bad_inputs = (
+            "",
+            " aa ",
+            "12345",
+            "1340am",
+            "030pm",
+            "25:23",
+            "24:10",
+            "this ain't nothing like a time",
+            "-2:30",
+        )
+
+        for bad_input in bad_inputs:
+            try:
+                self.field.clean(bad_input)
+                self.fail("Bad input %s validated." % bad_input)
+            except AssertionError, e:
+                raise e
+            except ValidationError, e:
+                pass
+            except Exception, e:
+                self.fail("Validator threw unexpected exception %s" % str(e))
+
+    def testLongInputs(self):
+        """
+        Tests that lots of whitespace doesn't slow us down, or stop us
+        from reading a time.
+        """
+        self.assertTimeEquals(" " * 5000 + "12:30" + " " * 5000 + "pm",
+                              dt.time(12, 30))
+        for bad_input in ("1" + " " * 5000 + "x", "12:30 p" + " " * 5000 + "x",
+                          "1" * 5000):
+            self.assertRaises(ValidationError, self.field.clean, bad_input)
+
+    def assertTimeEquals(self, timestring, expected):
+        """
+        Try to parse a time, and if it throws an exception, fail.
+        """
+        try:
+            actual = self.field.clean(timestring)
+            self.assertEquals(actual, expected,
+                    "String %s did not parse to expected datetime %s: Got %s" %
+                    (timestring, str(expected), str(actual))
+            )
+        except AssertionError, e:
+            # Propagate assertion failures.
+            raise e
+        except ValidationError, e:
+            self.fail("String %s did not validate." % timestring)
+        except Exception, e:
+            self.fail("String %s caused unexpected exception: %s" %
+                    (timestring, str(e)))
+
+
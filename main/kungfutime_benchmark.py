@@ -0,0 +1,106 @@
+"""
+Compares KungfuTimeField's parser with the regexp it replaced, on the
+strings from the tests in kungfutime.py and on some nasty ones.  Run
+it from this directory:
+
+    python kungfutime_benchmark.py [repeat]
+
+Both parsers are checked to agree on every input before timing.
+"""
+
+import datetime
+import sys
+import timeit
+
+import kungfutime
+from kungfutime import KungfuTimeField, parse_time
+
+# The strings from TestTimeParsing.
+TEST_INPUTS = (
+    "8:30", "14:30", "8", "16", "1742", "856", "101", "1 01", "13 01",
+    "01 01", " 13     01 ",
+    "12:30pm", "12:30PM", "12:30P.m.", "12:30 pm  ", "12:30 P m",
+    "12:30 p .  M  .", "12:30p", "12:30  p", "12 30pm", "12  30 pm",
+    "1230 p m", "  1230 p m", "12  30 p .  m  .", "1:30am", "1:30 am  ",
+    "1:30 a m", "1:30 a .  m  .", "1:30a", "1:30  a", "1 30am",
+    "  1  30 am", "130 a m", "3:30 p m", "     1  30 a .  m  ",
+    "", " aa ", "12345", "1340am", "030pm", "25:23", "24:10",
+    "this ain't nothing like a time", "-2:30",
+)
+
+# Long runs of whitespace make the regexp try every way of sharing
+# them out among its \s*'s.
+PATHOLOGICAL_INPUTS = (
+    "1" + " " * 40 + "x",
+    "12:30 p" + " " * 40 + "x",
+    "1" + " " * 80 + "x",
+    "12:30 p" + " " * 80 + "x",
+    "1" + " :" * 40,
+    "1" * 1000,
+)
+
+def regex_parse(value):
+    """ The old KungfuTimeField._parse_time, minus the exceptions. """
+    match = KungfuTimeField._TIME_PATTERN.match(value)
+    if not match:
+        return None
+    hour = int(match.group('hour'))
+    minute = int(match.group('minute') or 0)
+    second = int(match.group('second') or 0)
+    ampm = match.group('ampm')
+    if ampm:
+        if hour < 1 or hour > 12:
+            return None
+        elif ampm.lower() == "a" and hour == 12:
+            hour = 0
+        elif ampm.lower() == "p" and 1 <= hour and hour <= 11:
+            hour += 12
+    try:
+        return datetime.time(hour, minute, second)
+    except ValueError:
+        return None
+
+
+def uncached_parse(value):
+    """ parse_time, forgetting everything it has seen first. """
+    kungfutime._cache.clear()
+    return parse_time(value)
+
+
+def best_time(function, inputs, repeat):
+    """ Best per-call time, in microseconds, over the inputs. """
+    def run():
+        for value in inputs:
+            function(value)
+    timer = timeit.Timer(run)
+    return min(timer.repeat(3, repeat)) / (repeat * len(inputs)) * 1e6
+
+
+def main(repeat=200):
+    for value in TEST_INPUTS + PATHOLOGICAL_INPUTS:
+        if regex_parse(value) != parse_time(value):
+            print "Parsers disagree on %r: %s vs %s" % (
+                value, regex_parse(value), parse_time(value))
+            sys.exit(1)
+
+    print "%-28s %12s %12s %12s" % ('input', 'regexp', 'uncached', 'cached')
+    print "%-28s %12s %12s %12s" % ('test cases',
+        '%.1fus' % best_time(regex_parse, TEST_INPUTS, repeat),
+        '%.1fus' % best_time(uncached_parse, TEST_INPUTS, repeat),
+        '%.1fus' % best_time(parse_time, TEST_INPUTS, repeat))
+    for value in PATHOLOGICAL_INPUTS:
+        label = repr(value)
+        if len(label) > 28:
+            label = label[:22] + '...(%d)' % len(value)
+        # The regexp is slow enough here that a few runs will do.
+        print "%-28s %12s %12s %12s" % (label,
+            '%.1fus' % best_time(regex_parse, [value], 1),
+            '%.1fus' % best_time(uncached_parse, [value], repeat),
+            '%.1fus' % best_time(parse_time, [value], repeat))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
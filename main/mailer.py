@@ -0,0 +1,122 @@
+""" Bulk email for the BMC.
+
+send_mail opens a new SMTP connection for every message, and the old
+send_email view gave up on the whole run at the first error.  Here we
+record a BulkEmail with one BulkEmailRecipient per address, and send
+the pending recipients in batches, one SMTP connection per batch.
+Every recipient is marked sent or failed as we go, so calling
+send_bulk_email again picks up where an interrupted run left off.
+"""
+
+import datetime
+import time
+
+from django.core.mail import SMTPConnection, EmailMessage
+from django.db import transaction
+
+from bmc.settings import BULK_EMAIL_BATCH_SIZE, BULK_EMAIL_BATCH_PAUSE
+from models import BulkEmail, BulkEmailRecipient
+
+
+@transaction.commit_on_success
+def create_bulk_email(subject, message, from_email, users):
+    """ Record a new bulk email, addressed to each of the given users.
+    Nothing is sent until send_bulk_email is called. """
+    bulk_email = BulkEmail.objects.create(
+        subject=subject,
+        message=message,
+        from_email=from_email,
+        )
+    for user in users:
+        if not user.email:
+            continue
+        BulkEmailRecipient.objects.create(
+            bulk_email=bulk_email,
+            user=user,
+            email=user.email,
+            )
+    return bulk_email
+
+
+def send_bulk_email(bulk_email, batch_size=None, pause=None, retry=False,
+                    progress=None, connection=None):
+    """ Send a bulk email to everyone who hasn't gotten it yet.
+
+    Returns a (sent, failed) tuple of counts for this run.  If retry is
+    set, recipients that failed last time are tried again.  progress,
+    if given, is called with the running totals after every batch.
+    connection, if given, is an SMTPConnection to send everything over
+    (for sending several bulk emails in a row); the caller closes it.
+    """
+    if batch_size is None:
+        batch_size = BULK_EMAIL_BATCH_SIZE
+    if pause is None:
+        pause = BULK_EMAIL_BATCH_PAUSE
+
+    if retry:
+        bulk_email.recipients.filter(status='failed').update(
+            status='pending', error='')
+
+    sent = failed = 0
+    while True:
+        batch = list(bulk_email.recipients.filter(
+                status='pending')[:batch_size])
+        if not batch:
+            break
+
+        batch_sent, batch_failed = _send_batch(bulk_email, batch,
+                                               connection)
+        sent += batch_sent
+        failed += batch_failed
+        if progress:
+            progress(sent, failed)
+
+        if pause and len(batch) == batch_size:
+            time.sleep(pause)
+
+    return sent, failed
+
+
+def _send_batch(bulk_email, recipients, connection=None):
+    """ Send to a batch of recipients over a single connection (a new
+    one, unless we're given one). """
+    sent = failed = 0
+    own_connection = connection is None
+    if own_connection:
+        connection = SMTPConnection()
+    try:
+        for recipient in recipients:
+            message = EmailMessage(
+                bulk_email.subject,
+                bulk_email.message,
+                bulk_email.from_email,
+                [recipient.email],
+                connection=connection,
+                )
+            try:
+                connection.open()
+                message.send()
+            except Exception, e:
+                # Mark this one failed, and start over with a fresh
+                # connection in case the server hung up on us.
+                failed += 1
+                BulkEmailRecipient.objects.filter(id=recipient.id).update(
+                    status='failed', error=str(e))
+                _close(connection)
+            else:
+                sent += 1
+                BulkEmailRecipient.objects.filter(id=recipient.id).update(
+                    status='sent', error='', sent_at=datetime.datetime.now())
+    finally:
+        if own_connection:
+            _close(connection)
+
+    return sent, failed
+
+
+def _close(connection):
+    """ Hang up, without minding if the server already hung up on us. """
+    try:
+        connection.close()
+    except Exception:
+        pass
@@ -0,0 +1,29 @@
+""" Create the indexes in main/indexes.py, and any missing
+MembershipStandings, when syncdb runs. """
+
+from django.db.models.signals import post_syncdb
+
+from bmc.main import models
+
+def create_indexes(sender, verbosity=1, **kwargs):
+    from bmc.main.indexes import create_indexes
+    try:
+        created = create_indexes()
+    except NotImplementedError, e:
+        # Don't stop syncdb over indexes; add_indexes will complain.
+        if verbosity > 0:
+            print "Not creating indexes: %s" % e
+        return
+    for name in created:
+        if verbosity > 1:
+            print "Creating index %s" % name
+
+
+def create_standings(sender, verbosity=1, **kwargs):
+    from bmc.main.models import MembershipStanding
+    created = MembershipStanding.objects.create_missing()
+    if created and verbosity > 0:
+        print "Made standings for %d memberships" % created
+
+post_syncdb.connect(create_indexes, sender=models)
+post_syncdb.connect(create_standings, sender=models)
@@ -0,0 +1,60 @@
+""" Add the indexes in main/indexes.py to an existing database, and
+show how the database plans the queries they're for, before and
+after.
+
+    ./manage.py add_indexes
+    ./manage.py add_indexes --dry-run
+
+Indexes that are already there are left alone, so it's safe to run
+this more than once.  New databases get the indexes from syncdb.
+"""
+
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from bmc.main.indexes import (hot_queries, explain, missing_indexes,
+                              create_indexes)
+
+def print_plans(title):
+    print '-' * 8, title, '-' * 8
+    for (description, queryset) in hot_queries():
+        print description
+        for line in explain(queryset):
+            print '    ' + line
+
+
+class Command(NoArgsCommand):
+    help = "Add the indexes for the busy queries, showing their plans."
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--dry-run', action='store_true', dest='dry_run',
+                    default=False,
+                    help='Show the plans and missing indexes, but don\'t '
+                    'create them.'),
+        )
+
+    def handle_noargs(self, **options):
+        verbosity = int(options.get('verbosity', 1))
+
+        missing = missing_indexes()
+        if verbosity > 0:
+            print_plans('Before')
+            print
+
+        if not missing:
+            print "All the indexes are already there."
+            return
+
+        if options.get('dry_run'):
+            for (name, model, columns) in missing:
+                print "Would create %s on %s (%s)" % (
+                    name, model._meta.db_table, ', '.join(columns))
+            return
+
+        for name in create_indexes():
+            print "Created %s" % name
+
+        if verbosity > 0:
+            print
+            print_plans('After')
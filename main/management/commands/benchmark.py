@@ -0,0 +1,196 @@
+""" Time the busiest views against a made-up club.
+
+    ./manage.py benchmark --settings=bmc.bench_settings
+    ./manage.py benchmark --settings=bmc.bench_settings --members=5000 \\
+        --repeat=50 --only=index,profile
+
+This throws away the database named in bench_settings.py (a SQLite
+file) and everything in BENCHMARK_OUTPUT, fills the database with a
+synthetic club (see main/synthetic.py), then requests each view
+--repeat times through the test client and reports percentiles of
+the wall time and the number of queries.  Views that hand their work
+to a job (the CSV report, mailing labels, bulk email) have the job run
+as well, and it counts toward the time.  Email goes to a stand-in SMTP
+server on localhost that throws it away.  With --cold the public page
+cache is emptied before every request.
+"""
+
+import asyncore
+import math
+import os
+import re
+import shutil
+import smtpd
+import threading
+import time
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.client import Client
+
+from bmc.main import jobs, profiling
+from bmc.main.caching import bump
+from bmc.main.models import Job, UserProfile
+from bmc.main.synthetic import make_club, PASSWORD
+
+# (name, who asks, path, POST data or None, most repeats)  Bulk email
+# goes to every member, so it gets fewer runs.
+CASES = (
+    ('index', None, '/', None, None),
+    ('schedule', None, '/schedule', None, None),
+    ('profile', 'member', '/accounts/profile/', None, None),
+    ('list_memberships', 'admin', '/memberships/list/', None, None),
+    ('membership_report', 'admin',
+     '/memberships/membership_report/filter_active/order_-join_date/page_1',
+     None, None),
+    ('membership_report_csv', 'admin',
+     '/memberships/membership_report/filter_active/csv', None, None),
+    ('mailing_labels', 'admin', '/mushroom_admin/mailing_labels.csv',
+     None, None),
+    ('send_email', 'admin', '/email/send/',
+     { 'subject' : 'Benchmark', 'message' : 'Nothing to see here.' }, 3),
+    )
+
+JOB_URL = re.compile(r'/jobs/(\d+)/$')
+
+class SinkServer(smtpd.SMTPServer):
+    """ An SMTP server that counts messages and throws them away. """
+
+    def __init__(self, *args, **kwargs):
+        smtpd.SMTPServer.__init__(self, *args, **kwargs)
+        self.received = 0
+
+    def process_message(self, peer, mailfrom, rcpttos, data):
+        self.received += len(rcpttos)
+
+
+def start_smtp_server():
+    """ Start a SinkServer on a free port, and send email to it. """
+    server = SinkServer(('127.0.0.1', 0), None)
+    settings.EMAIL_HOST = '127.0.0.1'
+    settings.EMAIL_PORT = server.socket.getsockname()[1]
+    settings.EMAIL_HOST_USER = settings.EMAIL_HOST_PASSWORD = ''
+    settings.EMAIL_USE_TLS = False
+    thread = threading.Thread(target=asyncore.loop,
+                              kwargs={ 'timeout' : 0.1 })
+    thread.setDaemon(True)
+    thread.start()
+    return server
+
+
+def percentile(values, percent):
+    """ The nearest-rank percentile of a list of numbers. """
+    values = sorted(values)
+    rank = int(math.ceil(percent / 100.0 * len(values))) - 1
+    return values[max(0, rank)]
+
+
+def run_jobs(response):
+    """ If a view queued a job and sent us to its page, do the job. """
+    match = JOB_URL.search(response.get('Location', ''))
+    if match is None:
+        return
+    job = jobs.claim_next()
+    while job is not None:
+        jobs.run(job)
+        job = jobs.claim_next()
+    job = Job.objects.get(id=int(match.group(1)))
+    if job.status != 'done':
+        raise CommandError("The %s job failed:\n%s" % (job.kind, job.message))
+
+
+def time_case(client, path, data, repeat, cold):
+    """ Request a page repeat times; returns the times (in
+    milliseconds) and query counts. """
+    times, queries = [], []
+    for i in range(repeat):
+        if cold:
+            bump('pages')
+        collector = profiling.Collector()
+        profiling._local.collector = collector
+        try:
+            if data is None:
+                response = client.get(path)
+            else:
+                response = client.post(path, data)
+            if response.status_code not in (200, 302):
+                raise CommandError("%s gave a %d" % (
+                        path, response.status_code))
+            run_jobs(response)
+        finally:
+            profiling._local.collector = None
+        times.append((time.time() - collector.started) * 1000)
+        queries.append(collector.queries)
+    return times, queries
+
+
+class Command(BaseCommand):
+    help = "Time the busiest views against a synthetic club."
+
+    option_list = BaseCommand.option_list + (
+        make_option('--members', dest='members', type='int', default=2000,
+                    help='How many memberships to make.'),
+        make_option('--repeat', dest='repeat', type='int', default=20,
+                    help='How many times to request each view.'),
+        make_option('--only', dest='only',
+                    help='Only these views (names separated by commas).'),
+        make_option('--cold', action='store_true', dest='cold',
+                    default=False,
+                    help='Empty the page cache before every request.'),
+        make_option('--seed', dest='seed', type='int', default=1,
+                    help='Seed for making up the club.'),
+        )
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'BENCHMARK_DATABASE', False):
+            raise CommandError("This replaces the database; run it with "
+                               "--settings=bmc.bench_settings.")
+
+        cases = CASES
+        if options.get('only'):
+            names = options['only'].split(',')
+            cases = [case for case in CASES if case[0] in names]
+            unknown = set(names) - set([case[0] for case in cases])
+            if unknown:
+                raise CommandError("No such views: %s" % ', '.join(unknown))
+
+        print "Making a club of %d memberships..." % options['members']
+        connection.close()
+        if os.path.exists(settings.DATABASE_NAME):
+            os.remove(settings.DATABASE_NAME)
+        if os.path.isdir(settings.BENCHMARK_OUTPUT):
+            shutil.rmtree(settings.BENCHMARK_OUTPUT)
+        call_command('syncdb', interactive=False, verbosity=0)
+        start = time.time()
+        admin = make_club(options['members'], seed=options['seed'])
+        print "Made it in %.1fs." % (time.time() - start)
+
+        member = UserProfile.objects.filter(
+            user__is_active=True).order_by('id')[0].user
+        clients = { None : Client(), 'admin' : Client(),
+                    'member' : Client() }
+        clients['admin'].login(username=admin.username, password=PASSWORD)
+        clients['member'].login(username=member.username, password=PASSWORD)
+
+        server = start_smtp_server()
+        profiling.install()
+        try:
+            print
+            print '%-22s %5s %8s %8s %8s %8s %8s' % (
+                'view', 'runs', 'queries', 'p50 ms', 'p90 ms', 'p99 ms',
+                'max ms')
+            for (name, who, path, data, most) in cases:
+                repeat = min(options['repeat'], most or options['repeat'])
+                times, queries = time_case(clients[who], path, data,
+                                           repeat, options['cold'])
+                print '%-22s %5d %8d %8.1f %8.1f %8.1f %8.1f' % (
+                    name, repeat, percentile(queries, 50),
+                    percentile(times, 50), percentile(times, 90),
+                    percentile(times, 99), max(times))
+        finally:
+            server.close()
+        print
+        print "The stand-in SMTP server took %d messages." % server.received
@@ -0,0 +1,21 @@
+""" Pre-render the stylesheets (see main/stylesheets.py).
+
+Run this after deploying any change to bmc.css, aiee.css or
+MEDIA_URL.  The files it writes never change, so the web server can
+serve everything under MEDIA_ROOT/css/ with far-future expiry.
+"""
+
+from django.core.management.base import NoArgsCommand
+
+from bmc.main import stylesheets
+
+class Command(NoArgsCommand):
+    help = "Render, minify and write out the site's stylesheets."
+
+    def handle_noargs(self, **options):
+        verbosity = int(options.get('verbosity', 1))
+
+        manifest = stylesheets.build()
+        if verbosity > 0:
+            for name in stylesheets.STYLESHEETS:
+                print "%s.css -> %s" % (name, manifest[name])
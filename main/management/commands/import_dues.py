@@ -0,0 +1,296 @@
+""" Record a batch of dues payments from a CSV file, such as a bank or
+PayPal export.
+
+    ./manage.py import_dues --dry-run payments.csv
+    ./manage.py import_dues --payment-type=PayPal payments.csv
+
+The file needs a header row.  Each payment needs a date and an amount,
+and is matched to a membership by the first of these that finds one:
+
+    membership  a membership id
+    email       any household member's email address
+    name        a household member's "first last" name, or last name
+
+A payment that matches no membership, or more than one, is an error,
+as is an amount that isn't more than zero (refunds aren't dues).
+paid_thru, payment_type and notes columns are optional; without
+paid_thru, the membership is renewed for a year from whichever is
+later, its current paid_thru or the payment date.  Payments already
+on record (same membership, date and amount), or that appear earlier in
+the file, are skipped, so a file can safely be imported twice.  A
+payment type longer than the 20 characters the database holds is cut
+short, with a warning.
+
+Nothing is imported if any payment is bad; --dry-run just prints
+what would be done.
+"""
+
+import csv
+from decimal import Decimal, InvalidOperation
+from optparse import make_option
+
+from django.core.management.base import LabelCommand, CommandError
+from django.db import connection, transaction
+
+from bmc.main.caching import bump
+from bmc.main.models import Due, Membership, MembershipStanding, UserProfile
+from bmc.main.utilities import parse_dates
+
+# Column names we understand, and what bank and PayPal exports call
+# them.
+COLUMNS = {
+    'membership' : ('membership', 'membership_id', 'membership id'),
+    'email' : ('email', 'from email address', 'e-mail'),
+    'name' : ('name', 'payer', 'payer name'),
+    'payment_date' : ('payment_date', 'date', 'payment date'),
+    'payment_amount' : ('payment_amount', 'amount', 'gross'),
+    'payment_type' : ('payment_type', 'type'),
+    'paid_thru' : ('paid_thru', 'paid thru'),
+    'notes' : ('notes', 'note', 'memo'),
+    }
+
+class Command(LabelCommand):
+    help = "Import dues payments from CSV files."
+    args = '<file file ...>'
+    label = 'file'
+
+    option_list = LabelCommand.option_list + (
+        make_option('--payment-type', dest='payment_type',
+                    help='Payment type for rows that don\'t give one.'),
+        make_option('--dry-run', action='store_true', dest='dry_run',
+                    default=False,
+                    help='Show what would be recorded, but don\'t.'),
+        )
+
+    def handle_label(self, path, **options):
+        verbosity = int(options.get('verbosity', 1))
+
+        rows = read_payments(path)
+        dues, skipped, warnings, errors = match_payments(
+            rows, options.get('payment_type'))
+        if errors:
+            raise CommandError("%s:\n%s" % (path, '\n'.join(errors)))
+        if verbosity > 0 or options['dry_run']:
+            for line in warnings:
+                print "%s: %s" % (path, line)
+
+        if options['dry_run'] or verbosity > 1:
+            for due in dues:
+                print "%s: %s paid %s on %s (%s), paid through %s" % (
+                    due.membership_id, due.membership_name,
+                    due.payment_amount, due.payment_date, due.payment_type,
+                    due.paid_thru)
+            for line in skipped:
+                print line
+        if options['dry_run']:
+            print "%s: %d payments to record, %d duplicates to skip." % (
+                path, len(dues), len(skipped))
+            return
+
+        save_dues(dues)
+        if verbosity > 0:
+            print "%s: recorded %d payments, skipped %d duplicates." % (
+                path, len(dues), len(skipped))
+
+
+def read_payments(path):
+    """ The rows of a payment file, as dicts keyed by our column
+    names. """
+    try:
+        f = open(path, 'rb')
+    except IOError, e:
+        raise CommandError(str(e))
+    try:
+        reader = csv.reader(f)
+        try:
+            header = reader.next()
+        except StopIteration:
+            return []
+        # Excel likes to start its CSV files with a byte order mark.
+        header = [name.decode('utf-8-sig').strip().lower()
+                  for name in header]
+        columns = {}
+        for (field, aliases) in COLUMNS.items():
+            for (i, name) in enumerate(header):
+                if name in aliases:
+                    columns[field] = i
+                    break
+
+        rows = []
+        for values in reader:
+            if not [value for value in values if value.strip()]:
+                continue
+            row = {}
+            for (field, i) in columns.items():
+                if i < len(values):
+                    row[field] = values[i].decode('utf-8').strip()
+                else:
+                    row[field] = u''
+            rows.append(row)
+    finally:
+        f.close()
+    return rows
+
+
+def match_payments(rows, default_payment_type=None):
+    """ Match payments to memberships and turn them into unsaved Dues.
+
+    Returns (dues, skipped, warnings, errors).  Everything needed for
+    matching is loaded up front, in one query apiece, and indexed in
+    memory.
+    """
+    membership_ids = set(Membership.objects.values_list('id', flat=True))
+
+    by_email = {}
+    by_name = {}
+    names = {}
+    for (membership_id, email, first_name, last_name) in \
+            UserProfile.objects.values_list(
+            'membership', 'user__email', 'user__first_name',
+            'user__last_name'):
+        if email.strip():
+            by_email.setdefault(
+                email.strip().lower(), set()).add(membership_id)
+        full_name = ('%s %s' % (first_name, last_name)).strip().lower()
+        for name in (full_name, last_name.strip().lower()):
+            if name:
+                by_name.setdefault(name, set()).add(membership_id)
+        names.setdefault(membership_id, full_name.title())
+
+    paid_thru = dict(MembershipStanding.objects.values_list(
+            'membership', 'paid_thru'))
+
+    dates = parse_dates([row.get('payment_date', '') for row in rows])
+    thru_dates = parse_dates([row.get('paid_thru', '') for row in rows])
+
+    # Payments we already have, and ones earlier in the file.
+    recorded = set(Due.objects.filter(
+            payment_date__in=[date for date in dates if date is not None],
+            ).values_list('membership', 'payment_date', 'payment_amount'))
+    seen = set()
+    max_type = Due._meta.get_field('payment_type').max_length
+
+    dues = []
+    skipped = []
+    warnings = []
+    errors = []
+    for (number, row) in enumerate(rows):
+        problems = []
+
+        # The first of membership, email and name that matches
+        # anything decides it.
+        matches = set()
+        who = None
+        for field in ('membership', 'email', 'name'):
+            value = row.get(field)
+            if not value:
+                continue
+            who = who or value
+            if field == 'membership':
+                if value.isdigit() and int(value) in membership_ids:
+                    matches = set([int(value)])
+            elif field == 'email':
+                matches = by_email.get(value.lower(), set())
+            else:
+                matches = by_name.get(' '.join(value.lower().split()), set())
+            if matches:
+                who = value
+                break
+        if who is None:
+            problems.append("no membership, email or name")
+        elif not matches:
+            problems.append("no membership matches %r" % who)
+        elif len(matches) > 1:
+            problems.append("%r matches memberships %s" % (
+                    who, ', '.join([str(id) for id in sorted(matches)])))
+
+        if dates[number] is None:
+            problems.append("bad date %r" % row.get('payment_date', ''))
+        try:
+            amount = Decimal(row.get('payment_amount', '').replace(
+                    '$', '').replace(',', ''))
+        except InvalidOperation:
+            problems.append("bad amount %r" % row.get('payment_amount', ''))
+        else:
+            if amount <= 0:
+                # A refund or a fee, which mustn't renew anybody.
+                problems.append("amount %s isn't a payment" % amount)
+        if row.get('paid_thru') and thru_dates[number] is None:
+            problems.append("bad paid_thru %r" % row['paid_thru'])
+        payment_type = row.get('payment_type') or default_payment_type
+        if not payment_type:
+            problems.append("no payment type (use --payment-type)")
+
+        if problems:
+            errors.append("payment %d: %s" % (number + 1, '; '.join(problems)))
+            continue
+
+        membership_id = list(matches)[0]
+        payment = (membership_id, dates[number], amount)
+        if payment in recorded or payment in seen:
+            skipped.append("%s: %s paid %s on %s is already %s" % (
+                    membership_id, names.get(membership_id, ''), amount,
+                    dates[number], payment in seen and 'in the file'
+                    or 'recorded'))
+            continue
+        seen.add(payment)
+
+        if len(payment_type) > max_type:
+            warnings.append("payment %d: payment type %r cut to %r" % (
+                    number + 1, payment_type, payment_type[:max_type]))
+        due = Due(
+            membership_id=membership_id,
+            payment_date=dates[number],
+            payment_amount=amount,
+            payment_type=payment_type[:max_type],
+            notes=row.get('notes', ''),
+            )
+        due.paid_thru = thru_dates[number]
+        if due.paid_thru is None:
+            due.paid_thru = renewal_date(
+                paid_thru.get(membership_id), due.payment_date)
+        # Later payments in the same file renew from this one.
+        paid_thru[membership_id] = max(
+            due.paid_thru, paid_thru.get(membership_id) or due.paid_thru)
+        due.membership_name = names.get(membership_id, '')
+        dues.append(due)
+
+    return dues, skipped, warnings, errors
+
+
+def renewal_date(current, payment_date):
+    """ A year past the current paid_thru, or past the payment date if
+    the membership had lapsed (or never paid). """
+    start = current
+    if start is None or start < payment_date:
+        start = payment_date
+    try:
+        return start.replace(year=start.year + 1)
+    except ValueError:
+        # February 29th.
+        return start.replace(year=start.year + 1, day=28)
+
+
+@transaction.commit_on_success
+def save_dues(dues):
+    """ Insert all the dues with one executemany, then bring the
+    standings of the memberships that paid up to date. """
+    if not dues:
+        return
+    fields = [field for field in Due._meta.local_fields
+              if field.name != 'id']
+    qn = connection.ops.quote_name
+    sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+        qn(Due._meta.db_table),
+        ', '.join([qn(field.column) for field in fields]),
+        ', '.join(['%s'] * len(fields)),
+        )
+    connection.cursor().executemany(sql, [
+            [field.get_db_prep_save(field.pre_save(due, True))
+             for field in fields]
+            for due in dues])
+
+    # The inserts went around the signals that usually do this.
+    MembershipStanding.objects.refresh(
+        [due.membership_id for due in dues])
+    bump('dues')
@@ -0,0 +1,220 @@
+""" Load a season's walk schedule from a CSV or JSON file.
+
+    ./manage.py import_walks --creator=jsmith walks.csv
+
+CSV files need a header row; JSON files hold a list of objects.
+Either way the columns are the Walk fields: date, time, location,
+meeting_place and directions are required; public, permission,
+latitude, longitude, weather, terrain and notes are optional.  areas
+lists walk area names or ids separated by semicolons, and creator (a
+username) overrides --creator for a row.
+
+Every row is checked before anything is saved.  If any row is bad,
+the problems are listed and nothing is imported.
+"""
+
+import csv
+from decimal import Decimal, InvalidOperation
+from optparse import make_option
+
+from django.contrib.auth.models import User
+from django.core.management.base import LabelCommand, CommandError
+from django.db import connection, transaction
+from django.utils import simplejson
+
+from bmc.main.caching import bump
+from bmc.main.kungfutime import parse_times
+from bmc.main.models import Walk, WalkArea
+from bmc.main.utilities import parse_dates
+
+REQUIRED = ('date', 'time', 'location', 'meeting_place', 'directions')
+OPTIONAL_TEXT = ('weather', 'terrain', 'notes')
+TRUE_STRINGS = ('1', 'y', 'yes', 't', 'true', 'x')
+
+class Command(LabelCommand):
+    help = "Import walks from CSV or JSON files."
+    args = '<file file ...>'
+    label = 'file'
+
+    option_list = LabelCommand.option_list + (
+        make_option('--creator', dest='creator',
+                    help='Username to record as the creator of each walk.'),
+        make_option('--format', dest='format', choices=('csv', 'json'),
+                    help='csv or json (by default, from the file name).'),
+        make_option('--dry-run', action='store_true', dest='dry_run',
+                    default=False,
+                    help='Check the file, but don\'t import anything.'),
+        )
+
+    def handle_label(self, path, **options):
+        verbosity = int(options.get('verbosity', 1))
+
+        rows = read_rows(path, options.get('format'))
+        walks, errors = build_walks(rows, options.get('creator'))
+        if errors:
+            raise CommandError("%s:\n%s" % (path, '\n'.join(errors)))
+
+        if options['dry_run']:
+            if verbosity > 0:
+                print "%s: %d walks look fine." % (path, len(walks))
+            return
+
+        save_walks(walks)
+        # The area links went in behind the ORM's back, after the
+        # last save cleared the cached walk lists.
+        bump('walks')
+        if verbosity > 0:
+            print "%s: imported %d walks." % (path, len(walks))
+
+
+def read_rows(path, format=None):
+    """ The rows of a walk file, as dicts of strings, with None for
+    anything in a JSON file that isn't an object. """
+    if format is None:
+        if path.lower().endswith('.json'):
+            format = 'json'
+        else:
+            format = 'csv'
+
+    try:
+        f = open(path, 'rb')
+    except IOError, e:
+        raise CommandError(str(e))
+    try:
+        if format == 'json':
+            try:
+                rows = simplejson.load(f)
+            except ValueError, e:
+                raise CommandError("%s: %s" % (path, e))
+            if not isinstance(rows, list):
+                raise CommandError("%s: expected a list of walks" % path)
+        else:
+            rows = [dict((key, (value or '').decode('utf-8'))
+                         for (key, value) in row.items() if key)
+                    for row in csv.DictReader(f)]
+    finally:
+        f.close()
+
+    cleaned = []
+    for row in rows:
+        if not isinstance(row, dict):
+            cleaned.append(None)
+            continue
+        fields = {}
+        for (key, value) in row.items():
+            if value is None:
+                value = u''
+            elif isinstance(value, list):
+                # JSON can list the areas.
+                value = u';'.join([unicode(item) for item in value])
+            fields[key.strip().lower()] = unicode(value).strip()
+        cleaned.append(fields)
+    return cleaned
+
+
+def build_walks(rows, default_creator=None):
+    """ Turn rows into unsaved Walks, each with an area_ids list.
+
+    Returns (walks, errors); the areas and creators for the whole file
+    are each looked up in a single query. """
+    errors = []
+    dates = parse_dates([(row or {}).get('date', '') for row in rows])
+    times = parse_times([(row or {}).get('time', '') for row in rows])
+
+    area_names = {}
+    area_ids = set()
+    for area in WalkArea.objects.all():
+        area_names[area.name.lower()] = area.id
+        area_ids.add(area.id)
+
+    usernames = set([(row or {}).get('creator') or default_creator
+                     for row in rows])
+    usernames.discard(None)
+    users = dict((user.username, user) for user in
+                 User.objects.filter(username__in=usernames))
+
+    walks = []
+    for (number, row) in enumerate(rows):
+        if row is None:
+            errors.append("walk %d: not a walk (expected an object)" % (
+                    number + 1))
+            continue
+
+        problems = []
+        for field in REQUIRED:
+            if not row.get(field):
+                problems.append("%s is required" % field)
+        if row.get('date') and dates[number] is None:
+            problems.append("bad date %r" % row['date'])
+        if row.get('time') and times[number] is None:
+            problems.append("bad time %r" % row['time'])
+
+        username = row.get('creator') or default_creator
+        creator = users.get(username)
+        if creator is None:
+            if username:
+                problems.append("no such user %r" % username)
+            else:
+                problems.append("no creator (use --creator)")
+
+        walk_areas = []
+        for name in row.get('areas', '').split(';'):
+            name = name.strip()
+            if not name:
+                continue
+            if name.isdigit() and int(name) in area_ids:
+                walk_areas.append(int(name))
+            elif name.lower() in area_names:
+                walk_areas.append(area_names[name.lower()])
+            else:
+                problems.append("no such area %r" % name)
+
+        coordinates = {}
+        for field in ('latitude', 'longitude'):
+            if row.get(field):
+                try:
+                    coordinates[field] = Decimal(row[field])
+                except InvalidOperation:
+                    problems.append("bad %s %r" % (field, row[field]))
+
+        if problems:
+            errors.append("walk %d: %s" % (number + 1, '; '.join(problems)))
+            continue
+
+        walk = Walk(
+            creator=creator,
+            date=dates[number],
+            time=times[number],
+            location=row['location'],
+            meeting_place=row['meeting_place'],
+            directions=row['directions'],
+            public=row.get('public', '').lower() in TRUE_STRINGS,
+            permission=row.get('permission', '').lower() in TRUE_STRINGS,
+            **coordinates
+            )
+        for field in OPTIONAL_TEXT:
+            setattr(walk, field, row.get(field, ''))
+        walk.area_ids = sorted(set(walk_areas))
+        walks.append(walk)
+
+    return walks, errors
+
+
+@transaction.commit_on_success
+def save_walks(walks):
+    """ Save the walks, then link all of them to their areas with a
+    single executemany. """
+    for walk in walks:
+        walk.save()
+
+    areas = Walk._meta.get_field('areas')
+    qn = connection.ops.quote_name
+    sql = 'INSERT INTO %s (%s, %s) VALUES (%%s, %%s)' % (
+        qn(areas.m2m_db_table()),
+        qn(areas.m2m_column_name()),
+        qn(areas.m2m_reverse_name()),
+        )
+    links = [(walk.id, area_id) for walk in walks
+             for area_id in walk.area_ids]
+    if links:
+        connection.cursor().executemany(sql, links)
@@ -0,0 +1,42 @@
+""" Make the smaller copies of announcement pictures (see
+main/pictures.py) for pictures uploaded before we made them, or after
+changing PICTURE_SIZES (use --force).
+"""
+
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand, CommandError
+
+from bmc.main import pictures
+from bmc.main.models import Announcement, AnnouncementPicture
+
+class Command(NoArgsCommand):
+    help = "Make resized copies of every announcement picture."
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--force', action='store_true', dest='force',
+                    default=False,
+                    help='Remake copies that are already there.'),
+        )
+
+    def handle_noargs(self, **options):
+        verbosity = int(options.get('verbosity', 1))
+
+        if not pictures.available_formats():
+            raise CommandError("PIL isn't installed.")
+
+        if options['force']:
+            AnnouncementPicture.objects.all().delete()
+
+        made = failed = 0
+        for announcement in Announcement.objects.exclude(picture=''):
+            info = pictures.refresh_picture(announcement)
+            if info is None:
+                failed += 1
+                if verbosity > 0:
+                    print "Couldn't read %s" % announcement.picture.name
+            else:
+                made += 1
+
+        if verbosity > 0:
+            print "%d pictures ready, %d unreadable." % (made, failed)
@@ -0,0 +1,29 @@
+""" Rebuild the table of login addresses (LoginEmail) from scratch.
+
+Run this once after syncdb creates the table, and after changing
+users' addresses behind Django's back.
+"""
+
+from django.contrib.auth.models import User
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+
+from bmc.main.models import LoginEmail, normalize_email
+
+class Command(NoArgsCommand):
+    help = "Reload every user's normalized email address for logins."
+
+    @transaction.commit_on_success
+    def handle_noargs(self, **options):
+        verbosity = int(options.get('verbosity', 1))
+
+        LoginEmail.objects.all().delete()
+        count = 0
+        for user_id, email in User.objects.values_list('id', 'email'):
+            email = normalize_email(email)
+            if email:
+                LoginEmail.objects.create(user_id=user_id, email=email)
+                count += 1
+
+        if verbosity > 0:
+            print "Loaded %d addresses." % count
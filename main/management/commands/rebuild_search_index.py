@@ -0,0 +1,27 @@
+""" Rebuild the member search index (MemberSearchTerm) from scratch.
+
+Run this once after syncdb creates the table, and any time searches
+seem to be missing people.
+"""
+
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+
+from bmc.main.models import Membership, MemberSearchTerm
+
+class Command(NoArgsCommand):
+    help = "Reindex every membership for membership_search."
+
+    @transaction.commit_on_success
+    def handle_noargs(self, **options):
+        verbosity = int(options.get('verbosity', 1))
+
+        membership_ids = list(
+            Membership.objects.values_list('id', flat=True))
+        chunk_size = 500
+        for start in range(0, len(membership_ids), chunk_size):
+            MemberSearchTerm.objects.reindex(
+                membership_ids[start:start + chunk_size], create=True)
+
+        if verbosity > 0:
+            print "Indexed %d memberships." % len(membership_ids)
@@ -0,0 +1,29 @@
+""" Rebuild the denormalized MembershipStanding table from scratch.
+
+syncdb makes the standings for memberships that don't have one; run
+this any time the standings look out of step with the memberships
+(e.g. after editing the database by hand).
+"""
+
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+
+from bmc.main.models import Membership, MembershipStanding
+
+class Command(NoArgsCommand):
+    help = "Recompute the standing of every membership."
+
+    @transaction.commit_on_success
+    def handle_noargs(self, **options):
+        verbosity = int(options.get('verbosity', 1))
+
+        membership_ids = list(
+            Membership.objects.values_list('id', flat=True))
+        chunk_size = 500
+        for start in range(0, len(membership_ids), chunk_size):
+            MembershipStanding.objects.refresh(
+                membership_ids[start:start + chunk_size], create=True)
+
+        if verbosity > 0:
+            print "Rebuilt standings for %d memberships." % (
+                len(membership_ids))
@@ -0,0 +1,41 @@
+""" Work through the background job queue (see main/jobs.py).
+
+Run from cron with --once, or leave it running:
+
+    ./manage.py run_jobs --sleep=10
+"""
+
+import time
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from bmc.main import jobs
+
+class Command(NoArgsCommand):
+    help = "Run queued background jobs."
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--once', action='store_true', dest='once',
+                    default=False,
+                    help='Exit once the queue is empty.'),
+        make_option('--sleep', dest='sleep', type='int', default=5,
+                    help='Seconds to wait between checks of an empty queue.'),
+        )
+
+    def handle_noargs(self, **options):
+        verbosity = int(options.get('verbosity', 1))
+
+        while True:
+            job = jobs.claim_next()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['sleep'])
+                continue
+
+            if verbosity > 0:
+                print "Running %s" % job
+            jobs.run(job)
+            if verbosity > 0:
+                print "Finished %s" % job
@@ -0,0 +1,58 @@
+""" Email members about the walks added in their areas since the last
+digest (see main/digests.py).  Run it from cron, e.g. daily:
+
+    ./manage.py send_walk_digest
+    ./manage.py send_walk_digest --dry-run
+
+The emails are queued as a job for run_jobs to send, unless --now is
+given.
+"""
+
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from bmc.main import jobs
+from bmc.main.digests import (new_walks, walks_by_area, digest_groups,
+                              create_digest, send_digest)
+
+class Command(NoArgsCommand):
+    help = "Email members about new walks in their areas."
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--dry-run', action='store_true', dest='dry_run',
+                    default=False,
+                    help='Say who would hear about what, but send nothing.'),
+        make_option('--now', action='store_true', dest='now',
+                    default=False,
+                    help='Send the emails now instead of queuing a job.'),
+        )
+
+    def handle_noargs(self, **options):
+        verbosity = int(options.get('verbosity', 1))
+
+        if options.get('dry_run'):
+            walks = new_walks()
+            groups = walks and digest_groups(walks, walks_by_area(walks))
+            print "%d new walks." % len(walks)
+            for (group_walks, users) in groups or []:
+                print "%d members would hear about walks %s" % (
+                    len(users), ', '.join([str(walk.id)
+                                           for walk in group_walks]))
+            return
+
+        digest = create_digest()
+        if digest is None:
+            if verbosity > 0:
+                print "No new walks."
+            return
+
+        if options.get('now'):
+            sent, failed = send_digest(digest)
+            if verbosity > 0:
+                print "Sent %d walk digests, %d failed." % (sent, failed)
+        else:
+            job = jobs.enqueue('walk_digest', digest=digest.id)
+            if verbosity > 0:
+                print "Queued job %d to email %d members about %d walks." % (
+                    job.id, digest.unsent_count(), digest.walk_count)
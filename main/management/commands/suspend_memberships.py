@@ -0,0 +1,69 @@
+""" Suspend or restore memberships in bulk (see main/suspensions.py).
+
+    ./manage.py suspend_memberships 12 34 56
+    ./manage.py suspend_memberships --restore 12 34 56
+    ./manage.py suspend_memberships --lapsed-before=2010-01-01 --dry-run
+
+--lapsed-before is the annual lapse sweep: it suspends every active
+membership (other than Honorary and Corresponding ones) that hasn't
+paid through the given date.
+"""
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bmc.main.suspensions import (set_memberships_active,
+                                  lapsed_memberships)
+from bmc.main.utilities import parse_dates
+
+class Command(BaseCommand):
+    help = "Suspend (or restore) memberships by id, or all lapsed ones."
+    args = '[membership_id ...]'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--restore', action='store_true', dest='restore',
+                    default=False,
+                    help='Restore the memberships instead of suspending them.'),
+        make_option('--lapsed-before', dest='lapsed_before',
+                    help='Suspend active memberships not paid through this date.'),
+        make_option('--dry-run', action='store_true', dest='dry_run',
+                    default=False,
+                    help='List the memberships, but don\'t change them.'),
+        )
+
+    def handle(self, *args, **options):
+        verbosity = int(options.get('verbosity', 1))
+
+        lapsed_before = options.get('lapsed_before')
+        if lapsed_before:
+            if args or options['restore']:
+                raise CommandError(
+                    "--lapsed-before can't be used with ids or --restore.")
+            due_by = parse_dates([lapsed_before])[0]
+            if due_by is None:
+                raise CommandError("Bad date: %s" % lapsed_before)
+            membership_ids = list(lapsed_memberships(due_by).values_list(
+                    'id', flat=True))
+        else:
+            try:
+                membership_ids = [int(arg) for arg in args]
+            except ValueError:
+                raise CommandError("Membership ids must be numbers.")
+            if not membership_ids:
+                raise CommandError(
+                    "Give some membership ids, or --lapsed-before.")
+
+        if options['dry_run']:
+            print "Would %s %d memberships: %s" % (
+                options['restore'] and 'restore' or 'suspend',
+                len(membership_ids),
+                ' '.join([str(id) for id in membership_ids]))
+            return
+
+        memberships, users = set_memberships_active(
+            membership_ids, options['restore'])
+        if verbosity > 0:
+            print "%s %d memberships (%d users)." % (
+                options['restore'] and 'Restored' or 'Suspended',
+                memberships, users)
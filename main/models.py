@@ -1,9 +1,12 @@
-from django.db import models
+from django.db import connection, models
 from bmc.settings import *
 from django.contrib.auth.models import User
 from django.contrib.localflavor.us.models import USStateField, PhoneNumberField
 from django import forms
+from django.core.cache import cache
+from bmc.main.caching import make_key, bump_on_change
 import datetime
+import re
 
 class WalkArea(models.Model):
     """ Members might only want to hear about walks in their area.
@@ -13,6 +16,105 @@ class WalkArea(models.Model):
     def __unicode__(self):
         return self.name
 
+# How many memberships to hand to load_roster at a time when iterating
+# over a roster queryset.
+ROSTER_CHUNK_SIZE = 100
+
+def load_roster(memberships):
+    """ Fetch the profiles, users and most recent dues for a list of
+    memberships in two queries, and attach them to each membership so
+    that the Membership helpers don't have to go back to the database.
+    """
+    memberships = list(memberships)
+    if not memberships:
+        return memberships
+
+    by_id = dict((membership.id, membership) for membership in memberships)
+    for membership in memberships:
+        membership._roster_profiles = []
+        membership._roster_due = None
+
+    profile_model = models.get_model('main', 'UserProfile')
+    profiles = profile_model.objects.filter(
+        membership__in=by_id.keys(),
+        ).select_related('user').order_by('id')
+    for profile in profiles:
+        by_id[profile.membership_id]._roster_profiles.append(profile)
+
+    # Only the latest due of each membership, not its whole history.
+    # (Ties come back newest first, like the rest.)
+    due_model = models.get_model('main', 'Due')
+    qn = connection.ops.quote_name
+    table = qn(due_model._meta.db_table)
+    dues = due_model.objects.filter(membership__in=by_id.keys()).extra(
+        where=['%s.%s = (SELECT MAX(latest.%s) FROM %s latest '
+               'WHERE latest.%s = %s.%s)' % (
+                table, qn('paid_thru'), qn('paid_thru'), table,
+                qn('membership_id'), table, qn('membership_id'))])
+    for due in dues:
+        membership = by_id[due.membership_id]
+        if membership._roster_due is None:
+            membership._roster_due = due
+
+    return memberships
+
+
+class MembershipQuerySet(models.query.QuerySet):
+    """ QuerySet that can preload each membership's roster (see
+    load_roster) as it is iterated over.
+    """
+    _with_roster = False
+
+    def with_roster(self):
+        return self._clone(_with_roster=True)
+
+    def overdue(self, due_by):
+        """ Memberships that haven't paid through due_by (or have never
+        paid), leaving out the types that don't pay dues.  Reads the
+        latest paid_thru from MembershipStanding, so it's a range scan
+        on one indexed column rather than an anti-join on Due. """
+        return self.filter(
+            models.Q(standing__paid_thru__lt=due_by) |
+            models.Q(standing__paid_thru__isnull=True)
+            ).exclude(
+            membership_type__in=DUES_EXEMPT_MEMBERSHIP_TYPES,
+            )
+
+    def _clone(self, klass=None, setup=False, **kwargs):
+        kwargs.setdefault('_with_roster', self._with_roster)
+        return super(MembershipQuerySet, self)._clone(
+            klass, setup, **kwargs)
+
+    def iterator(self):
+        if not self._with_roster:
+            for membership in super(MembershipQuerySet, self).iterator():
+                yield membership
+            return
+
+        chunk = []
+        for membership in super(MembershipQuerySet, self).iterator():
+            chunk.append(membership)
+            if len(chunk) == ROSTER_CHUNK_SIZE:
+                for membership in load_roster(chunk):
+                    yield membership
+                chunk = []
+        for membership in load_roster(chunk):
+            yield membership
+
+
+class MembershipManager(models.Manager):
+    def get_query_set(self):
+        return MembershipQuerySet(self.model)
+
+    def with_roster(self):
+        """ Memberships with their profiles, users and latest due
+        loaded in bulk. """
+        return self.get_query_set().with_roster()
+
+    def overdue(self, due_by):
+        return self.get_query_set().overdue(due_by)
+
+
 class Membership(models.Model):
     """ Each BMC Membership is tied to a specific address; multiple
     members of the same household can have different usernames.
@@ -42,12 +144,18 @@ class Membership(models.Model):
         choices=MEMBERSHIP_TYPES
         )
 
+    objects = MembershipManager()
+
     def get_profiles(self):
+        if hasattr(self, '_roster_profiles'):
+            return self._roster_profiles
         model = models.get_model('main', 'UserProfile')
         profiles = model.objects.filter(membership=self)
         return profiles
 
     def get_most_recent_due(self):
+        if hasattr(self, '_roster_due'):
+            return self._roster_due or '--'
         model = models.get_model('main', 'Due')
         dues = model.objects.filter(membership=self)
         try:
@@ -87,9 +195,8 @@ class Membership(models.Model):
     def get_email_list(self):
         profiles = self.get_profiles()
         try:
-            email_list = ', '.join(
-                (profile.get_email()
-                 ) for profile in profiles)
+            emails = [profile.get_email() for profile in profiles]
+            email_list = ', '.join(email for email in emails if email)
         except:    #@@@ Evil generic exception
             email_list = 'blank'            
 
@@ -196,6 +303,260 @@ class UserProfile(models.Model):
         return  '%s %s' % (first_name, last_name)
 
 
+class MembershipStandingManager(models.Manager):
+    def refresh(self, membership_ids, create=False):
+        """ Recompute the standing of the given memberships from their
+        users, profiles and dues.
+
+        Memberships without a standing are skipped unless create is
+        set; otherwise deleting a membership would resurrect its
+        standing as the profiles and dues are deleted out from under
+        it.
+        """
+        membership_ids = set(membership_ids)
+        if not membership_ids:
+            return
+
+        standings = dict(
+            (standing.membership_id, standing) for standing in
+            self.filter(membership__in=membership_ids))
+
+        memberships = Membership.objects.with_roster().filter(
+            id__in=membership_ids)
+        for membership in memberships:
+            standing = standings.get(membership.id)
+            if standing is None:
+                if not create:
+                    continue
+                standing = self.model(membership=membership)
+            standing.update_from(membership)
+            standing.save()
+
+    def create_missing(self):
+        """ Make standings for the memberships that don't have one
+        (those from before there were standings).  Returns how many
+        were made. """
+        membership_ids = list(Membership.objects.filter(
+                standing__isnull=True).values_list('id', flat=True))
+        chunk_size = 500
+        for start in range(0, len(membership_ids), chunk_size):
+            self.refresh(membership_ids[start:start + chunk_size],
+                         create=True)
+        return len(membership_ids)
+
+
+class MembershipStanding(models.Model):
+    """ Denormalized summary of a membership, so that reports and
+    listings can filter on a single indexed column instead of joining
+    through every profile and due.
+
+    Kept up to date by the signal handlers at the bottom of this
+    module.  syncdb makes the standings that are missing, and
+    ./manage.py rebuild_standings fills the table in from scratch.
+    """
+    membership = models.OneToOneField(Membership, related_name='standing')
+
+    # Active if any user in the household is active.
+    active = models.BooleanField(default=False, db_index=True)
+    # paid_thru of the most recent due, if there is one.
+    paid_thru = models.DateField(blank=True, null=True, db_index=True)
+
+    name_list = models.TextField(blank=True)
+    anded_name_list = models.TextField(blank=True)
+    email_list = models.TextField(blank=True)
+
+    objects = MembershipStandingManager()
+
+    def update_from(self, membership):
+        """ Copy the current state of a membership (preferably one
+        loaded with_roster) into this record. """
+        self.active = membership.is_active()
+        due = membership.get_most_recent_due()
+        if due == '--':
+            self.paid_thru = None
+        else:
+            self.paid_thru = due.paid_thru
+        self.name_list = membership.get_name_list()
+        self.anded_name_list = membership.get_anded_name_list()
+        self.email_list = membership.get_email_list()
+
+    def __unicode__(self):
+        if self.active:
+            status = "active"
+        else:
+            status = "suspended"
+        return '%s (%s)' % (self.name_list, status)
+
+
+MAX_SEARCH_TERM_LENGTH = 40
+MAX_SEARCH_WORDS = 5
+
+def search_tokens(text):
+    """ Split text into lowercase words for the member search index. """
+    return re.findall(r'[a-z0-9]+', text.lower())
+
+
+class MemberSearchTermManager(models.Manager):
+    def reindex(self, membership_ids, create=False):
+        """ Bring the search terms for the given memberships up to
+        date, only touching the terms that changed.
+
+        As with MembershipStanding.objects.refresh, memberships that
+        have no terms yet are skipped unless create is set.
+        """
+        membership_ids = set(membership_ids)
+        if not membership_ids:
+            return
+
+        existing = {}
+        for term in self.filter(membership__in=membership_ids):
+            existing.setdefault(term.membership_id, {})[term.term] = term
+
+        memberships = Membership.objects.with_roster().filter(
+            id__in=membership_ids)
+        for membership in memberships:
+            old_terms = existing.get(membership.id)
+            if old_terms is None:
+                if not create:
+                    continue
+                old_terms = {}
+
+            new_terms = set(self.terms_for(membership))
+            stale = [term.id for word, term in old_terms.items()
+                     if word not in new_terms]
+            if stale:
+                self.filter(id__in=stale).delete()
+            for word in new_terms:
+                if word not in old_terms:
+                    self.create(membership=membership, term=word)
+
+    def terms_for(self, membership):
+        """ Every word that should find this membership. """
+        terms = [str(membership.id)]
+        for text in (membership.address, membership.address2,
+                     membership.city, membership.zip,
+                     membership.organization):
+            terms += search_tokens(text)
+        for profile in membership.get_profiles():
+            user = profile.user
+            for text in (user.first_name, user.last_name, user.email):
+                terms += search_tokens(text)
+        return [term[:MAX_SEARCH_TERM_LENGTH] for term in terms]
+
+    def search(self, query):
+        """ Memberships with a term starting with each word of the
+        query (so 'smi bos' finds the Smiths in Boston).  One query,
+        using the index on term for each word. """
+        words = search_tokens(query)[:MAX_SEARCH_WORDS]
+        if not words:
+            # Not none(): callers want a MembershipQuerySet, for
+            # with_roster().
+            return Membership.objects.filter(pk__in=[])
+
+        memberships = Membership.objects.all()
+        for word in words:
+            # A separate filter() per word, so each word gets its own
+            # join and can match a different term.
+            memberships = memberships.filter(
+                search_terms__term__startswith=word[:MAX_SEARCH_TERM_LENGTH])
+        return memberships.distinct()
+
+
+class MemberSearchTerm(models.Model):
+    """ One word from a membership's names, emails, address or id,
+    for membership_search.  Kept up to date by the signal handlers at
+    the bottom of this module; ./manage.py rebuild_search_index builds
+    it from scratch.
+    """
+    membership = models.ForeignKey(Membership, related_name='search_terms')
+    term = models.CharField(max_length=MAX_SEARCH_TERM_LENGTH, db_index=True)
+
+    objects = MemberSearchTermManager()
+
+    def __unicode__(self):
+        return self.term
+
+
+def normalize_email(email):
+    """ The form of an address we look logins up by. """
+    return (email or '').strip().lower()
+
+
+class LoginEmailManager(models.Manager):
+    def refresh(self, user):
+        """ Record a user's current address, or forget it if they
+        don't have one. """
+        email = normalize_email(user.email)
+        if not email:
+            self.filter(user=user.id).delete()
+        elif not self.filter(user=user.id).update(email=email):
+            self.create(user_id=user.id, email=email)
+
+    def candidate(self, email):
+        """ The one user to check a password against for an address.
+        Households sometimes share an address; active users win over
+        suspended ones, then whoever logged in most recently. """
+        matches = self.filter(
+            email=normalize_email(email),
+            ).select_related('user').order_by(
+            '-user__is_active', '-user__last_login', 'user')[:1]
+        if matches:
+            return matches[0].user
+        return None
+
+
+class LoginEmail(models.Model):
+    """ Each user's email address, lowercased and indexed, so that
+    logging in by address doesn't scan auth_user.  Kept up to date by
+    the signal handlers at the bottom of this module;
+    ./manage.py rebuild_login_emails builds it from scratch.
+    """
+    user = models.OneToOneField(User, related_name='login_email')
+    email = models.CharField(max_length=75, db_index=True)
+
+    objects = LoginEmailManager()
+
+    def __unicode__(self):
+        return self.email
+
+
+class WalkManager(models.Manager):
+    def upcoming(self):
+        """ Walks from today on, soonest first. """
+        return self.filter(
+            date__gte=datetime.date.today(),
+            ).order_by('date', 'time')
+
+    def upcoming_for_member(self, user_profile, cache_timeout=None):
+        """ Upcoming walks in any of a member's areas, soonest first,
+        without duplicates.
+
+        If cache_timeout is given, the list is cached for that many
+        seconds under the member's set of areas (members who share
+        areas share the entry); saving or deleting a walk invalidates
+        it.
+        """
+        if not cache_timeout:
+            return list(self.upcoming().filter(
+                    areas__userprofile=user_profile,
+                    ).distinct())
+
+        area_ids = sorted(
+            user_profile.areas.values_list('id', flat=True))
+        if not area_ids:
+            return []
+
+        key = make_key('walks', 'areas', datetime.date.today(),
+                       '-'.join([str(area_id) for area_id in area_ids]))
+        walks = cache.get(key)
+        if walks is None:
+            walks = list(self.upcoming().filter(
+                    areas__in=area_ids,
+                    ).distinct())
+            cache.set(key, walks, cache_timeout)
+        return walks
+
+
 class Walk(models.Model):
     """ One of the most import thing that members can do is create
     walks.
@@ -235,28 +596,97 @@ class Walk(models.Model):
     mushrooms_found = models.TextField(blank=True)
     notes = models.TextField(blank=True)
 
+    objects = WalkManager()
+
     def __unicode__(self):
         return '%s %s' % (self.location, self.date)
 
     class Meta:
         ordering = ["-date"]
 
+class AnnouncementManager(models.Manager):
+    def at_second(self, timestamp):
+        """ Announcements within the second starting at timestamp,
+        oldest (by id) first.  An indexed range scan, which also
+        catches timestamps saved with microseconds. """
+        return self.filter(
+            timestamp__gte=timestamp,
+            timestamp__lt=timestamp + datetime.timedelta(seconds=1),
+            ).order_by('id')
+
+    def get_by_permalink(self, timestamp):
+        """ The story that a permalink points to.  If stories from
+        before save() kept them apart share the second, the first one
+        saved wins.  Raises Announcement.DoesNotExist if there isn't
+        one. """
+        key = make_key('announcements', 'story', 
+                       timestamp.strftime('%Y%m%d%H%M%S'))
+        story = cache.get(key)
+        if story is None:
+            try:
+                story = self.at_second(timestamp)[0]
+            except IndexError:
+                raise self.model.DoesNotExist
+            cache.set(key, story, STORY_CACHE_TIMEOUT)
+        return story
+
+
 class Announcement(models.Model):
     """ Announcements for the front page.  
+
+    The timestamp doubles as the story's permalink
+    (/Stories/YYYY/MM/DD/HH:MM:SS), so it's indexed, and save() makes
+    sure that no two stories share the same second.
     """
-    timestamp = models.DateTimeField(default=datetime.datetime.now())
+    timestamp = models.DateTimeField(
+        default=datetime.datetime.now, 
+        db_index=True,
+        )
     heading = models.CharField(max_length=40)
     summary = models.TextField()
     full_story = models.TextField(blank=True)
     picture = models.FileField(upload_to='uploaded_pics/', blank=True,);
     picture_caption = models.TextField(blank=True)
 
+    objects = AnnouncementManager()
+
     class Meta:
         ordering = ["-timestamp"]
 
+    def save(self, *args, **kwargs):
+        # Permalinks only go down to the second; if another story
+        # already has this one, take the next free second.
+        self.timestamp = self.timestamp.replace(microsecond=0)
+        while Announcement.objects.at_second(self.timestamp).exclude(
+            id=self.id).count():
+            self.timestamp += datetime.timedelta(seconds=1)
+        super(Announcement, self).save(*args, **kwargs)
+
+    def get_absolute_url(self):
+        return '/Stories/%s' % self.timestamp.strftime('%Y/%m/%d/%H:%M:%S')
+
     def __unicode__(self):
         return  '%s' % (self.heading)
 
+class AnnouncementPicture(models.Model):
+    """ What main/pictures.py made from an announcement's picture: the
+    original's dimensions, and the formats its smaller copies were
+    saved in.  source is the picture these were made from, so we can
+    tell when it's been replaced.
+    """
+    announcement = models.OneToOneField(
+        Announcement, related_name='picture_info')
+    source = models.CharField(max_length=100)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    formats = models.CharField(max_length=20, blank=True)
+
+    def get_formats(self):
+        return self.formats.split()
+
+    def __unicode__(self):
+        return '%s (%dx%d)' % (self.source, self.width, self.height)
+
 class Newsbit(models.Model):
     """ Quick news blurbs to go on the front page for stuff that
     doesn't need a full announcement.
@@ -314,6 +744,154 @@ class Nugget(models.Model):
         return '%s (%s)' % (self.text, status)
 
 
+class BulkEmail(models.Model):
+    """ An email sent to many members at once.  Each recipient is
+    tracked separately, so that an interrupted send can pick up where
+    it left off (see main/mailer.py).
+    """
+    subject = models.CharField(max_length=200)
+    message = models.TextField()
+    from_email = models.CharField(max_length=75)
+    created = models.DateTimeField(default=datetime.datetime.now)
+
+    class Meta:
+        ordering = ["-created"]
+
+    def unsent_count(self):
+        return self.recipients.exclude(status='sent').count()
+
+    def __unicode__(self):
+        return '%s (%s)' % (self.subject, self.created)
+
+BULK_EMAIL_STATUSES = (
+    ('pending', 'Pending'),
+    ('sent', 'Sent'),
+    ('failed', 'Failed'),
+    )
+
+class BulkEmailRecipient(models.Model):
+    """ One address that a BulkEmail goes out to. """
+    bulk_email = models.ForeignKey(BulkEmail, related_name='recipients')
+    user = models.ForeignKey(User, blank=True, null=True)
+    email = models.EmailField()
+    status = models.CharField(
+        max_length=10,
+        choices=BULK_EMAIL_STATUSES,
+        default='pending',
+        db_index=True,
+        )
+    error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["id"]
+
+    def __unicode__(self):
+        return '%s (%s)' % (self.email, self.status)
+
+
+class WalkDigest(models.Model):
+    """ A round of emails telling members about new walks in their
+    areas (see main/digests.py): one BulkEmail for each different set
+    of walks that members are told about.  Walks up to last_walk (an
+    id) have been covered.
+    """
+    created = models.DateTimeField(default=datetime.datetime.now)
+    last_walk = models.PositiveIntegerField()
+    walk_count = models.PositiveIntegerField(default=0)
+    bulk_emails = models.ManyToManyField(BulkEmail, blank=True)
+
+    class Meta:
+        ordering = ["-created"]
+
+    def unsent_count(self):
+        return BulkEmailRecipient.objects.filter(
+            bulk_email__in=self.bulk_emails.all()).exclude(
+            status='sent').count()
+
+    def __unicode__(self):
+        return '%d walks (%s)' % (self.walk_count, self.created)
+
+
+JOB_STATUSES = (
+    ('queued', 'Queued'),
+    ('running', 'Running'),
+    ('done', 'Done'),
+    ('failed', 'Failed'),
+    )
+
+class Job(models.Model):
+    """ A long running admin task (bulk email, big exports), queued
+    up for ./manage.py run_jobs to do out of band.  See main/jobs.py.
+    """
+    kind = models.CharField(max_length=30)
+    arguments = models.TextField(blank=True)  # JSON
+    status = models.CharField(
+        max_length=10,
+        choices=JOB_STATUSES,
+        default='queued',
+        db_index=True,
+        )
+    progress = models.IntegerField(default=0)
+    total = models.IntegerField(blank=True, null=True)
+    message = models.TextField(blank=True)
+    # Name of the file the job wrote, relative to JOB_OUTPUT_DIR.
+    output = models.CharField(max_length=100, blank=True)
+
+    created_by = models.ForeignKey(User, blank=True, null=True)
+    created = models.DateTimeField(default=datetime.datetime.now)
+    started = models.DateTimeField(blank=True, null=True)
+    finished = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["-created"]
+
+    def get_arguments(self):
+        from django.utils import simplejson
+        if not self.arguments:
+            return {}
+        arguments = {}
+        for key, value in simplejson.loads(self.arguments).items():
+            arguments[str(key)] = value
+        return arguments
+
+    def is_finished(self):
+        return self.status in ('done', 'failed')
+
+    def percent_done(self):
+        if not self.total:
+            return None
+        return min(100, 100 * self.progress / self.total)
+
+    def __unicode__(self):
+        return '%s #%s (%s)' % (self.kind, self.id, self.status)
+
+
+class RequestProfile(models.Model):
+    """ How long one request took, recorded by main/profiling.py.
+    Times are in milliseconds.  duplicates holds the queries that were
+    run more than once, a line each.
+    """
+    started = models.DateTimeField(default=datetime.datetime.now,
+                                   db_index=True)
+    path = models.CharField(max_length=255)
+    method = models.CharField(max_length=10)
+    view = models.CharField(max_length=100, db_index=True)
+    status = models.PositiveIntegerField()
+    wall_time = models.FloatField()
+    queries = models.PositiveIntegerField()
+    query_time = models.FloatField()
+    duplicate_queries = models.PositiveIntegerField()
+    duplicates = models.TextField(blank=True)
+    template_time = models.FloatField()
+
+    class Meta:
+        ordering = ["-started"]
+
+    def __unicode__(self):
+        return '%s %s (%.0fms)' % (self.method, self.path, self.wall_time)
+
+
 class Page(models.Model):
     """ A generic page.  
     """
@@ -324,3 +902,88 @@ class Page(models.Model):
         return '%s' % (self.name)
 
 
+"""----------------------------------------------------------------
+  Keep MembershipStanding, the search index and logins up to date
+----------------------------------------------------------------"""
+
+from django.db.models.signals import post_init, post_save, post_delete
+
+# The User fields that standings, search terms and login emails are
+# built from.  Logging in saves the user too (for last_login), and that
+# shouldn't cost a refresh of everything.
+WATCHED_USER_FIELDS = ('first_name', 'last_name', 'email', 'is_active')
+
+def watched_user_fields(user):
+    return tuple([getattr(user, name) for name in WATCHED_USER_FIELDS])
+
+def membership_changed(sender, instance, **kwargs):
+    MembershipStanding.objects.refresh([instance.id], create=True)
+    MemberSearchTerm.objects.reindex([instance.id], create=True)
+
+def profile_changed(sender, instance, **kwargs):
+    MembershipStanding.objects.refresh([instance.membership_id])
+    MemberSearchTerm.objects.reindex([instance.membership_id])
+
+def user_changed(sender, instance, **kwargs):
+    membership_ids = list(UserProfile.objects.filter(
+        user=instance.id,
+        ).values_list('membership', flat=True))
+    MembershipStanding.objects.refresh(membership_ids)
+    MemberSearchTerm.objects.reindex(membership_ids)
+
+def due_changed(sender, instance, **kwargs):
+    MembershipStanding.objects.refresh([instance.membership_id])
+
+def user_loaded(sender, instance, **kwargs):
+    instance._watched_fields = watched_user_fields(instance)
+
+def user_saved(sender, instance, created=False, **kwargs):
+    fields = watched_user_fields(instance)
+    if not created and getattr(instance, '_watched_fields', None) == fields:
+        return
+    user_changed(sender, instance)
+    # Deleting the user deletes its LoginEmail along with it.
+    LoginEmail.objects.refresh(instance)
+    instance._watched_fields = fields
+
+post_save.connect(membership_changed, sender=Membership)
+post_save.connect(profile_changed, sender=UserProfile)
+post_delete.connect(profile_changed, sender=UserProfile)
+post_init.connect(user_loaded, sender=User)
+post_save.connect(user_saved, sender=User)
+post_delete.connect(user_changed, sender=User)
+post_save.connect(due_changed, sender=Due)
+post_delete.connect(due_changed, sender=Due)
+
+
+"""----------------------------------------------------------------
+           Make the smaller copies of announcement pictures
+----------------------------------------------------------------"""
+
+def announcement_saved(sender, instance, **kwargs):
+    # Resizing a big picture is too slow (and PIL too fragile) to do
+    # while the admin waits.
+    from bmc.main.jobs import enqueue
+    from bmc.main.pictures import needs_refresh
+    if needs_refresh(instance):
+        enqueue('announcement_picture', announcement=instance.id)
+
+def announcement_picture_deleted(sender, instance, **kwargs):
+    from bmc.main.pictures import delete_pictures
+    delete_pictures(instance)
+
+post_save.connect(announcement_saved, sender=Announcement)
+post_delete.connect(announcement_picture_deleted, sender=AnnouncementPicture)
+
+
+"""----------------------------------------------------------------
+                  Invalidate cached pages and lists
+----------------------------------------------------------------"""
+
+bump_on_change(Walk, 'walks')
+bump_on_change(Announcement, 'announcements')
+bump_on_change(Newsbit, 'newsbits')
+bump_on_change(PublicWalk, 'publicwalks')
+bump_on_change(IDSession, 'idsessions')
+bump_on_change(Nugget, 'nuggets')
+bump_on_change(Due, 'dues')
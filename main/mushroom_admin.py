@@ -10,6 +10,7 @@ class entries():
     MODEL = ''
     FORM = ''
     NAME = ''
+    ORDER_FIELD = 'id'  # indexed column to page on, newest first
     VIEW_TEMPLATE = 'view_entry.html'  # rarely gets used
     EDIT_TEMPLATE = 'edit_entry.html'
     LIST_TEMPLATE = 'list_entries.html'
@@ -31,11 +32,13 @@ class newsbits(entries):
     MODEL = Newsbit
     FORM = NewsbitForm
     NAME = 'newsbit'
+    ORDER_FIELD = 'timestamp'
 
 class announcements(entries):
     MODEL = Announcement
     FORM = AnnouncementForm
     NAME = 'announcement'
+    ORDER_FIELD = 'timestamp'
 
 class pages(entries):
     MODEL = Page
@@ -0,0 +1,218 @@
+""" Smaller copies of announcement pictures.
+
+Pictures are uploaded straight off the camera: several megabytes
+each, with the camera's EXIF data (GPS position and all) attached.
+Whenever an Announcement is saved with a new picture, a job (see
+main/jobs.py) is queued to make a copy to fit each of PICTURE_SIZES, as a JPEG and, if PIL can write them, a
+WebP, and record the original's dimensions in an AnnouncementPicture.
+The copies are saved without EXIF data.  Templates ask for a size
+with {% announcement_picture announcement "web" %}.
+
+PIL is optional.  Without it (or for a picture it can't read) no
+copies are made and the templates show the original, as before, as
+they do until the job has run.  What PIL couldn't read is logged.
+./manage.py make_pictures makes copies for pictures already uploaded.
+"""
+
+import logging
+import os
+from cStringIO import StringIO
+
+try:
+    from PIL import Image
+except ImportError:
+    try:
+        import Image
+    except ImportError:
+        Image = None
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from bmc.settings import PICTURE_SIZES, PICTURE_QUALITY
+from models import AnnouncementPicture
+
+log = logging.getLogger('bmc.main.pictures')
+
+# Copies go in a directory next to the originals.
+DERIVED_DIR = 'derived'
+
+EXIF_ORIENTATION = 274
+
+# How to turn a picture the right way up, for each EXIF orientation.
+ORIENTATIONS = {
+    2 : ('FLIP_LEFT_RIGHT',),
+    3 : ('ROTATE_180',),
+    4 : ('FLIP_TOP_BOTTOM',),
+    5 : ('ROTATE_90', 'FLIP_TOP_BOTTOM'),
+    6 : ('ROTATE_270',),
+    7 : ('ROTATE_270', 'FLIP_TOP_BOTTOM'),
+    8 : ('ROTATE_90',),
+    }
+
+EXTENSIONS = {
+    'jpeg' : 'jpg',
+    'webp' : 'webp',
+    }
+
+def available_formats():
+    """ The formats we can save copies in. """
+    if Image is None:
+        return []
+    Image.init()
+    return [format for format in ('jpeg', 'webp')
+            if format.upper() in Image.SAVE]
+
+
+def derived_name(source, size, format):
+    """ Where the copy of a picture at a size is stored, relative to
+    MEDIA_ROOT.  The name keeps the original's extension, so that
+    morel.jpg and morel.png don't share copies. """
+    directory, filename = os.path.split(source)
+    return '/'.join([directory, DERIVED_DIR,
+                     '%s-%s.%s' % (filename, size, EXTENSIONS[format])])
+
+
+def fit(width, height, box):
+    """ Dimensions of a width x height picture shrunk to fit in box
+    (never enlarged). """
+    box_width, box_height = box
+    scale = min(1.0, float(box_width) / width, float(box_height) / height)
+    return (max(1, int(round(width * scale))),
+            max(1, int(round(height * scale))))
+
+
+def orientation(image):
+    """ The EXIF orientation of a picture (1 if it's upright). """
+    try:
+        return image._getexif()[EXIF_ORIENTATION]
+    except Exception:
+        return 1
+
+
+def upright(image, turn):
+    """ Turn a picture the right way up, since the copies won't carry
+    its EXIF orientation. """
+    for method in ORIENTATIONS.get(turn, ()):
+        image = image.transpose(getattr(Image, method))
+    return image
+
+
+def needs_refresh(announcement):
+    """ Whether refresh_picture has anything to do for an
+    announcement. """
+    source = announcement.picture and announcement.picture.name
+    try:
+        info = AnnouncementPicture.objects.get(announcement=announcement.id)
+    except AnnouncementPicture.DoesNotExist:
+        return bool(source)
+    return info.source != source
+
+
+def refresh_picture(announcement):
+    """ Make the copies of an announcement's picture, unless they've
+    already been made from this picture.  Returns the
+    AnnouncementPicture, or None if there are no copies to be had. """
+    try:
+        info = AnnouncementPicture.objects.get(announcement=announcement.id)
+    except AnnouncementPicture.DoesNotExist:
+        info = None
+
+    source = announcement.picture and announcement.picture.name
+    if info is not None:
+        if info.source == source:
+            return info
+        # The picture was replaced or removed.  (Deleting the record
+        # deletes its copies.)
+        info.delete()
+    if not source:
+        return None
+    return make_pictures(announcement)
+
+
+def delete_pictures(info):
+    """ Delete the copies recorded in an AnnouncementPicture. """
+    for size in PICTURE_SIZES:
+        for format in info.get_formats():
+            name = derived_name(info.source, size, format)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+
+
+def make_pictures(announcement):
+    """ Make and save the copies of an announcement's picture, and
+    record what we made. """
+    formats = available_formats()
+    if not formats:
+        return None
+
+    source = announcement.picture.name
+    f = default_storage.open(source)
+    try:
+        image = Image.open(f)
+        turn = orientation(image)
+        width, height = image.size
+        if turn in (5, 6, 7, 8):
+            width, height = height, width
+
+        if image.format == 'JPEG':
+            # Decode the JPEG at a fraction of its size, which is far
+            # quicker; it only goes as small as the biggest copy needs.
+            biggest = max([max(box) for box in PICTURE_SIZES.values()])
+            image.draft('RGB', fit(width, height, (biggest, biggest)))
+        image = upright(image.convert('RGB'), turn)
+    except Exception:
+        # Corrupt and unsupported pictures raise all sorts, from
+        # IOError to SyntaxError and MemoryError.
+        log.exception("Can't read picture %s", source)
+        f.close()
+        return None
+    f.close()
+
+    for (size, box) in PICTURE_SIZES.items():
+        copy = image.resize(fit(width, height, box), Image.ANTIALIAS)
+        for format in formats:
+            data = StringIO()
+            copy.save(data, format.upper(), quality=PICTURE_QUALITY,
+                      optimize=(format == 'jpeg'))
+            name = derived_name(source, size, format)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            default_storage.save(name, ContentFile(data.getvalue()))
+
+    return AnnouncementPicture.objects.create(
+        announcement=announcement,
+        source=source,
+        width=width,
+        height=height,
+        formats=' '.join(formats),
+        )
+
+
+def load_pictures(announcements):
+    """ Attach their AnnouncementPictures to a list of announcements in
+    one query, for announcement_picture. """
+    announcements = list(announcements)
+    by_id = dict((announcement.id, announcement)
+                 for announcement in announcements)
+    for announcement in announcements:
+        announcement._picture_info = None
+    for info in AnnouncementPicture.objects.filter(
+        announcement__in=by_id.keys()):
+        by_id[info.announcement_id]._picture_info = info
+    return announcements
+
+
+def picture_info(announcement):
+    """ An announcement's AnnouncementPicture, if its copies are up to
+    date. """
+    try:
+        info = announcement._picture_info
+    except AttributeError:
+        try:
+            info = announcement.picture_info
+        except AnnouncementPicture.DoesNotExist:
+            info = None
+    if info is not None and info.source != announcement.picture.name:
+        return None
+    return info
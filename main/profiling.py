@@ -0,0 +1,224 @@
+""" Numbers on how long each page takes to make.
+
+ProfilingMiddleware times every request and records a RequestProfile:
+which view handled it, the wall time, how many SQL queries it ran and
+how long they took, how long its templates took to render, and which
+queries it ran more than once (the fingerprint of a query is its SQL
+before the parameters go in, so the same lookup for a different id
+counts as a repeat: the usual sign of a lookup in a loop that should
+have been one query).  /mushroom_admin/profiles/ lists the slowest
+views.
+
+Profiling is off unless PROFILE_REQUESTS is set (in
+local_settings.py), since recording a profile is a query of its own
+on every request.  Only the most recent PROFILE_KEEP requests are
+kept, and requests faster than PROFILE_MIN_TIME milliseconds aren't
+recorded at all.
+"""
+
+import re
+import threading
+import time
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.db.models import Avg, Count, Max
+from django.template import Template
+
+from bmc.settings import PROFILE_REQUESTS, PROFILE_KEEP, PROFILE_MIN_TIME
+from models import RequestProfile
+
+# How many of the most repeated queries to record for a request.
+DUPLICATES_SHOWN = 5
+
+# Prune old profiles every this many requests, rather than every time.
+PRUNE_EVERY = 100
+
+_local = threading.local()
+
+def current():
+    """ The Collector for the request this thread is handling, if it's
+    being profiled. """
+    return getattr(_local, 'collector', None)
+
+
+class Collector(object):
+    """ What one request has done so far. """
+
+    def __init__(self):
+        self.started = time.time()
+        self.view = ''
+        self.queries = 0
+        self.query_time = 0.0
+        self.template_time = 0.0
+        self.rendering = False
+        self.fingerprints = {}
+
+    def query(self, sql, elapsed, times=1):
+        self.queries += times
+        self.query_time += elapsed
+        key = fingerprint(sql)
+        self.fingerprints[key] = self.fingerprints.get(key, 0) + times
+
+    def duplicates(self):
+        """ (count, fingerprint) for each query run more than once, most
+        repeated first. """
+        repeated = [(count, sql) for (sql, count)
+                    in self.fingerprints.items() if count > 1]
+        repeated.sort(reverse=True)
+        return repeated
+
+
+def fingerprint(sql):
+    """ A query with the differences between runs of it taken out:
+    lists of parameters and literals collapse, and whitespace is
+    squeezed. """
+    sql = sql.replace('%s', '?')
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+\b', '?', sql)
+    sql = re.sub(r'\?(?:\s*,\s*\?)+', '?', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+class ProfilingCursor(object):
+    """ Wraps a database cursor and tells the Collector about every
+    query. """
+
+    def __init__(self, cursor, collector):
+        self.cursor = cursor
+        self.collector = collector
+
+    def execute(self, sql, params=()):
+        start = time.time()
+        try:
+            return self.cursor.execute(sql, params)
+        finally:
+            self.collector.query(sql, time.time() - start)
+
+    def executemany(self, sql, param_list):
+        start = time.time()
+        try:
+            return self.cursor.executemany(sql, param_list)
+        finally:
+            self.collector.query(sql, time.time() - start,
+                                 max(1, len(param_list)))
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+
+"""----------------------------------------------------------------
+                 Hooks into the database and templates
+----------------------------------------------------------------"""
+
+_installed = []
+
+def install():
+    """ Wrap connection.cursor and Template.render so that they report
+    to the current Collector.  Harmless to call more than once. """
+    if _installed:
+        return
+    _installed.append(True)
+
+    original_cursor = connection.cursor
+    def cursor():
+        collector = current()
+        if collector is None:
+            return original_cursor()
+        return ProfilingCursor(original_cursor(), collector)
+    connection.cursor = cursor
+
+    original_render = Template.render
+    def render(self, context):
+        collector = current()
+        # Included templates are part of their parent's time.
+        if collector is None or collector.rendering:
+            return original_render(self, context)
+        collector.rendering = True
+        start = time.time()
+        try:
+            return original_render(self, context)
+        finally:
+            collector.template_time += time.time() - start
+            collector.rendering = False
+    Template.render = render
+
+
+class ProfilingMiddleware(object):
+    """ Record a RequestProfile for each request.  Put it first in
+    MIDDLEWARE_CLASSES, so that its time covers the other
+    middleware. """
+
+    def __init__(self):
+        if not PROFILE_REQUESTS:
+            # Django drops the middleware, so it costs nothing.
+            raise MiddlewareNotUsed
+        install()
+        self.recorded = 0
+
+    def process_request(self, request):
+        _local.collector = Collector()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        collector = current()
+        if collector is not None:
+            view = getattr(view_func, '__name__',
+                           view_func.__class__.__name__)
+            collector.view = '%s.%s' % (view_func.__module__, view)
+
+    def process_response(self, request, response):
+        collector = current()
+        _local.collector = None
+        if collector is not None:
+            self.record(request, response, collector)
+        return response
+
+    def record(self, request, response, collector):
+        wall_time = (time.time() - collector.started) * 1000
+        if wall_time < PROFILE_MIN_TIME:
+            return
+        duplicates = collector.duplicates()
+        RequestProfile.objects.create(
+            path=request.path[:255],
+            method=request.method,
+            view=collector.view[:100],
+            status=response.status_code,
+            wall_time=wall_time,
+            queries=collector.queries,
+            query_time=collector.query_time * 1000,
+            duplicate_queries=sum([count - 1 for (count, sql)
+                                   in duplicates]),
+            duplicates='\n'.join(['%dx %s' % (count, sql) for (count, sql)
+                                  in duplicates[:DUPLICATES_SHOWN]]),
+            template_time=collector.template_time * 1000,
+            )
+        self.recorded += 1
+        if self.recorded % PRUNE_EVERY == 0:
+            prune()
+
+
+def prune(keep=None):
+    """ Delete all but the most recent keep (or PROFILE_KEEP)
+    profiles. """
+    if keep is None:
+        keep = PROFILE_KEEP
+    newest = RequestProfile.objects.aggregate(newest=Max('id'))['newest']
+    if newest is not None:
+        RequestProfile.objects.filter(id__lte=newest - keep).delete()
+
+
+def slowest_views(limit=25):
+    """ Averages and worst cases for each view, slowest on average
+    first. """
+    return RequestProfile.objects.values('view').annotate(
+        requests=Count('id'),
+        average_time=Avg('wall_time'),
+        worst_time=Max('wall_time'),
+        average_queries=Avg('queries'),
+        worst_queries=Max('queries'),
+        average_duplicates=Avg('duplicate_queries'),
+        average_template_time=Avg('template_time'),
+        ).order_by('-average_time')[:limit]
@@ -0,0 +1,93 @@
+""" The site's stylesheets, built ahead of time.
+
+bmc.css and aiee.css are templates (they need MEDIA_URL), so they used
+to be rendered by main.views.style on every request.  build() renders
+them once, minifies them, and writes them under MEDIA_ROOT with a
+hash of their contents in the name, so the web server can hand them
+out with far-future expiry headers; a changed stylesheet gets a new
+name.  base.html asks stylesheet_url() where to find each one, and
+gets the old /bmc.css view if nothing has been built.
+"""
+
+import os
+import re
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils import simplejson
+from django.utils.hashcompat import md5_constructor
+
+from bmc.main.caching import bump
+from bmc.settings import MEDIA_URL, CSS_DIR
+
+STYLESHEETS = ('bmc', 'aiee')
+
+def render_stylesheet(name):
+    """ A stylesheet, fresh from its template. """
+    return render_to_string(name + '.css', { 'media_url' : MEDIA_URL, })
+
+
+def minify(css):
+    """ Squeeze the comments and most of the whitespace out of a
+    stylesheet. """
+    css = re.sub(r'(?s)/\*.*?\*/', '', css)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    css = css.replace(';}', '}')
+    return css.strip() + '\n'
+
+
+def build():
+    """ Render, minify and write out every stylesheet, and record
+    their URLs in CSS_MANIFEST.  Returns the manifest. """
+    directory = os.path.join(settings.MEDIA_ROOT, CSS_DIR)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    manifest = {}
+    for name in STYLESHEETS:
+        css = minify(render_stylesheet(name)).encode('utf-8')
+        filename = '%s.%s.css' % (name, md5_constructor(css).hexdigest()[:12])
+        path = os.path.join(directory, filename)
+        if not os.path.exists(path):
+            out = open(path, 'wb')
+            try:
+                out.write(css)
+            finally:
+                out.close()
+        manifest[name] = '%s/%s/%s' % (MEDIA_URL, CSS_DIR, filename)
+
+    # Write the manifest all at once, so that nobody reads half of it.
+    temporary = settings.CSS_MANIFEST + '.tmp'
+    out = open(temporary, 'w')
+    try:
+        simplejson.dump(manifest, out)
+    finally:
+        out.close()
+    os.rename(temporary, settings.CSS_MANIFEST)
+    _manifest.clear()
+    # Cached pages still point at the old stylesheets.
+    bump('pages')
+    return manifest
+
+
+# The manifest as last read, and when it was last changed.
+_manifest = {}
+
+def stylesheet_url(name):
+    """ Where to find a stylesheet: the built copy if there is one,
+    otherwise main.views.style. """
+    try:
+        modified = os.stat(settings.CSS_MANIFEST).st_mtime
+    except OSError:
+        return '/%s.css' % name
+
+    if _manifest.get('modified') != modified:
+        try:
+            urls = simplejson.load(open(settings.CSS_MANIFEST))
+        except (IOError, ValueError):
+            urls = {}
+        _manifest.clear()
+        _manifest.update({ 'modified' : modified, 'urls' : urls })
+    return _manifest['urls'].get(name, '/%s.css' % name)
@@ -0,0 +1,56 @@
+""" Suspending and restoring memberships in bulk.
+
+A membership is suspended by deactivating every user attached to it,
+and restored by activating them again.  Rather than saving each User
+(which sends every signal, and rewrites every column), we flip
+auth_user.is_active with a single UPDATE for the whole batch, and
+refresh the affected MembershipStandings afterwards.
+"""
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.query import QuerySet
+
+from models import Membership, MembershipStanding, UserProfile
+
+@transaction.commit_on_success
+def set_memberships_active(memberships, active):
+    """ Suspend (active=False) or restore (active=True) every user in
+    the given memberships, which may be a queryset or a list of ids.
+
+    Returns a (memberships, users) tuple of how many of each actually
+    changed; users who were already in the right state aren't
+    touched.
+    """
+    if isinstance(memberships, QuerySet):
+        memberships = memberships.values_list('id', flat=True)
+
+    changing = UserProfile.objects.filter(
+        membership__in=list(memberships),
+        ).exclude(user__is_active=active).values_list('user', 'membership')
+    user_ids = set()
+    membership_ids = set()
+    for (user_id, membership_id) in changing:
+        user_ids.add(user_id)
+        membership_ids.add(membership_id)
+    if not user_ids:
+        return 0, 0
+
+    User.objects.filter(id__in=list(user_ids)).update(is_active=active)
+    # The update went around the signal handlers that usually do this.
+    MembershipStanding.objects.refresh(membership_ids)
+    return len(membership_ids), len(user_ids)
+
+
+def suspend(memberships):
+    return set_memberships_active(memberships, False)
+
+
+def restore(memberships):
+    return set_memberships_active(memberships, True)
+
+
+def lapsed_memberships(due_by):
+    """ Active memberships that haven't paid through due_by (or ever),
+    leaving out the types that don't pay dues. """
+    return Membership.objects.overdue(due_by).filter(standing__active=True)
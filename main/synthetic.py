@@ -0,0 +1,182 @@
+""" A made-up club, for benchmarks.
+
+make_club() fills an empty database with memberships, their users and
+profiles, a history of dues, walk areas and a season of walks, in
+roughly the proportions of the real club.  The same seed always makes
+the same club.  Rows go in with executemany, around the signals, and
+the standings, search index and login emails are rebuilt at the end.
+
+Never point this at a database you care about; see bench_settings.py.
+"""
+
+import datetime
+import random
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, transaction
+
+from bmc.main.models import (WalkArea, Membership, UserProfile, Due, Walk)
+
+AREAS = ('Boston', 'North Shore', 'South Shore', 'Metro West',
+         'Worcester', 'Cape Cod', 'Pioneer Valley', 'Berkshires')
+
+# (membership type, how many in a hundred)
+MEMBERSHIP_MIX = (('Individual', 60), ('Family', 30), ('Junior', 5),
+                  ('Corresponding', 3), ('Honorary', 2))
+
+FIRST_NAMES = ('Ann', 'Bill', 'Carol', 'Dave', 'Edith', 'Frank', 'Grace',
+               'Hal', 'Iris', 'Jack', 'Kate', 'Leo', 'Mary', 'Ned')
+LAST_NAMES = ('Smith', 'Jones', 'Brown', 'Wilson', 'Taylor', 'Clark',
+              'Lewis', 'Walker', 'Hall', 'Young', 'King', 'Wright')
+PAYMENT_TYPES = ('check', 'cash', 'paypal')
+
+# Everyone's password, so that the benchmark can log in as anyone.
+PASSWORD = 'benchmark'
+
+def insert(model, objects):
+    """ Insert model instances, ids and all, with one executemany. """
+    if not objects:
+        return
+    fields = model._meta.local_fields
+    qn = connection.ops.quote_name
+    sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+        qn(model._meta.db_table),
+        ', '.join([qn(field.column) for field in fields]),
+        ', '.join(['%s'] * len(fields)),
+        )
+    connection.cursor().executemany(sql, [
+            [field.get_db_prep_save(field.pre_save(obj, True))
+             for field in fields]
+            for obj in objects])
+
+
+def link(model, field_name, pairs):
+    """ Insert (object id, related id) pairs into a many to many
+    table. """
+    if not pairs:
+        return
+    field = model._meta.get_field(field_name)
+    qn = connection.ops.quote_name
+    sql = 'INSERT INTO %s (%s, %s) VALUES (%%s, %%s)' % (
+        qn(field.m2m_db_table()),
+        qn(field.m2m_column_name()),
+        qn(field.m2m_reverse_name()),
+        )
+    connection.cursor().executemany(sql, pairs)
+
+
+def membership_type(rand):
+    pick = rand.randint(1, 100)
+    for (kind, share) in MEMBERSHIP_MIX:
+        pick -= share
+        if pick <= 0:
+            return kind
+    return MEMBERSHIP_MIX[0][0]
+
+
+@transaction.commit_on_success
+def make_club(members=2000, walks=150, seed=1):
+    """ Fill the database with a club of the given number of
+    memberships.  Returns the superuser it makes, 'benchmark'. """
+    rand = random.Random(seed)
+    today = datetime.date.today()
+    now = datetime.datetime.now()
+
+    hasher = User(username='benchmark')
+    hasher.set_password(PASSWORD)
+    password = hasher.password
+
+    areas = [WalkArea(id=i + 1, name=name) for (i, name) in enumerate(AREAS)]
+    insert(WalkArea, areas)
+
+    admin = User(id=1, username='benchmark', first_name='Bench',
+                 last_name='Mark', email='benchmark@example.org',
+                 password=password, is_staff=True, is_superuser=True,
+                 last_login=now, date_joined=now)
+    insert(User, [admin])
+
+    memberships, users, profiles, dues, area_links = [], [], [], [], []
+    for number in range(1, members + 1):
+        kind = membership_type(rand)
+        joined = today.year - rand.randint(0, 15)
+        memberships.append(Membership(
+                id=number,
+                join_date=datetime.date(joined, rand.randint(1, 12), 1),
+                address='%d Main St' % rand.randint(1, 999),
+                city=rand.choice(AREAS),
+                state='MA',
+                zip='0%04d' % rand.randint(1000, 2999),
+                membership_type=kind,
+                ))
+
+        for person in range(kind == 'Family' and 2 or 1):
+            user_id = len(users) + 2
+            first = rand.choice(FIRST_NAMES)
+            last = rand.choice(LAST_NAMES)
+            users.append(User(
+                    id=user_id,
+                    username='member%d' % user_id,
+                    first_name=first,
+                    last_name=last,
+                    email='%s.%s.%d@example.org' % (
+                        first.lower(), last.lower(), user_id),
+                    password=password,
+                    is_active=rand.random() < 0.9,
+                    last_login=now,
+                    date_joined=now,
+                    ))
+            profiles.append(UserProfile(
+                    id=user_id,
+                    membership_id=number,
+                    user_id=user_id,
+                    want_email=rand.random() < 0.85,
+                    ))
+            for area in rand.sample(areas, rand.randint(1, 3)):
+                area_links.append((user_id, area.id))
+
+        # A payment a year from joining until they stopped (most
+        # haven't).
+        if kind not in ('Corresponding', 'Honorary'):
+            last_paid = today.year - max(0, rand.randint(-6, 3))
+            for year in range(joined, max(joined, last_paid) + 1):
+                dues.append(Due(
+                        id=len(dues) + 1,
+                        membership_id=number,
+                        payment_date=datetime.date(
+                            year, rand.randint(1, 3), rand.randint(1, 28)),
+                        payment_amount=kind == 'Family' and '25' or '20',
+                        payment_type=rand.choice(PAYMENT_TYPES),
+                        paid_thru=datetime.date(year, 12, 31),
+                        ))
+
+    insert(Membership, memberships)
+    insert(User, users)
+    insert(UserProfile, profiles)
+    link(UserProfile, 'areas', area_links)
+    insert(Due, dues)
+
+    # A season of walks, from this week to next autumn.
+    season, walk_links = [], []
+    for number in range(1, walks + 1):
+        season.append(Walk(
+                id=number,
+                creator_id=admin.id,
+                date=today + datetime.timedelta(days=rand.randint(-30, 400)),
+                time=datetime.time(rand.choice((9, 10, 13)), 0),
+                public=rand.random() < 0.3,
+                location='Woods number %d' % number,
+                meeting_place='The parking lot',
+                directions='Turn left at the big oak.',
+                ))
+        for area in rand.sample(areas, rand.randint(1, 2)):
+            walk_links.append((number, area.id))
+    insert(Walk, season)
+    link(Walk, 'areas', walk_links)
+
+    # The inserts went around the signals that keep these up to date.
+    for command in ('rebuild_standings', 'rebuild_search_index',
+                    'rebuild_login_emails'):
+        call_command(command, verbosity=0)
+
+    return admin
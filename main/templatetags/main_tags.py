@@ -1,32 +1,86 @@
-from random import randint
+from random import choice
 
 from django import template
+from django.core.cache import cache
+from django.utils.html import escape
 
-from main.models import Nugget
+from bmc.main.models import Nugget
+from bmc.main.caching import generation, make_key
+from bmc.main.pictures import picture_info, derived_name, fit
+from bmc.main.stylesheets import stylesheet_url
+from bmc.settings import MEDIA_URL, PICTURE_SIZES
 
 register = template.Library()
 
+# The list is thrown out whenever a nugget is saved or deleted, so it
+# can stay cached for a good long while.
+NUGGET_CACHE_TIMEOUT = 60 * 60 * 24
+
+# This process's copy of the list, and the generation it's from.
+_nuggets = {}
+
+def active_nuggets():
+    """ Texts of all the active nuggets.  Each process keeps its own
+    copy for as long as the 'nuggets' generation stays the same, so
+    most pages only look up the generation; the shared cache and then
+    the database are asked after a change.
+
+    """
+    current = generation('nuggets')
+    if _nuggets.get('generation') == current:
+        return _nuggets['texts']
+
+    key = make_key('nuggets', 'active')
+    nuggets = cache.get(key)
+    if nuggets is None:
+        nuggets = list(Nugget.objects.filter(
+                active=True,
+                ).values_list('text', flat=True))
+        cache.set(key, nuggets, NUGGET_CACHE_TIMEOUT)
+    _nuggets.clear()
+    _nuggets.update({ 'generation' : current, 'texts' : nuggets })
+    return nuggets
+
 def get_nugget():
     """ Grab and display a random fact nugget
 
     """
-    nuggets = Nugget.objects.filter(
-        active=True,
-        )
+    nuggets = active_nuggets()
 
     if not nuggets:
         nugget = """
 I'm sorry.  I could not find any active facts in the database."""
 
     else:
-        nugget = randint(0, len(nuggets) - 1)
-
-        try:
-            nugget = nuggets[nugget].text
-        except IndexError:
-            nugget = """
-I'm sorry.  I've run into an error retrieving this BMC Fact."""
+        nugget = choice(nuggets)
     
     return nugget
 
 register.simple_tag(get_nugget)
+
+
+def announcement_picture(announcement, size):
+    """ An announcement's picture, at one of PICTURE_SIZES, as a WebP
+    for browsers that take them and a JPEG for the rest.  Falls back
+    to the original if the copies haven't been made.
+
+    """
+    alt = escape(announcement.picture_caption)
+    info = picture_info(announcement)
+    if info is None or size not in PICTURE_SIZES:
+        return '<img src="%s/%s" alt="%s" />' % (
+            MEDIA_URL, escape(announcement.picture.name), alt)
+
+    width, height = fit(info.width, info.height, PICTURE_SIZES[size])
+    img = '<img src="%s/%s" width="%d" height="%d" alt="%s" />' % (
+        MEDIA_URL, escape(derived_name(info.source, size, 'jpeg')),
+        width, height, alt)
+    if 'webp' not in info.get_formats():
+        return img
+    return ('<picture><source srcset="%s/%s" type="image/webp" />%s'
+            '</picture>') % (
+        MEDIA_URL, escape(derived_name(info.source, size, 'webp')), img)
+
+register.simple_tag(announcement_picture)
+
+register.simple_tag(stylesheet_url)
@@ -0,0 +1,43 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from bmc.main.models import Membership, MemberSearchTerm
+
+class MembershipSearchTest(TestCase):
+
+    def setUp(self):
+        self.membership = Membership.objects.create(
+            join_date=datetime.date(2009, 1, 1),
+            address='1 Main St',
+            city='Boston',
+            state='MA',
+            zip='02101',
+            membership_type='Individual',
+            )
+        MemberSearchTerm.objects.reindex([self.membership.id], create=True)
+        User.objects.create_superuser('admin', 'admin@example.org', 'admin')
+        self.client.login(username='admin', password='admin')
+
+    def testSearch(self):
+        """
+        A word from the address finds the membership.
+        """
+        self.assertEqual(
+            [membership.id for membership
+             in MemberSearchTerm.objects.search('bos').with_roster()],
+            [self.membership.id])
+
+    def testNoWords(self):
+        """
+        A search with nothing but punctuation or whitespace finds
+        nothing, rather than failing.
+        """
+        for query in ('', '  ', '---', '?!'):
+            self.assertEqual(
+                list(MemberSearchTerm.objects.search(query).with_roster()),
+                [])
+            response = self.client.get('/memberships/search/',
+                                       { 'last_name' : query })
+            self.assertEqual(response.status_code, 200)
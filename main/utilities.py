@@ -1,5 +1,11 @@
 """ Misc Useful Utilities """
 
+import datetime
+import time
+
+from django.db.models import Q
+from django.forms.fields import DEFAULT_DATE_INPUT_FORMATS
+
 class prev_next:
     """ Make a series of prev, next links.  I'd be a nice guy if I
     took the time to add 'first' and 'last' links, plus links to each
@@ -24,6 +30,108 @@ class prev_next:
 
 
 
+class seek_page:
+    """ Page through a queryset, newest first, by seeking past the
+    last row shown ('after' cursor) or before the first one ('before'
+    cursor), instead of having the database count off and throw away
+    'start' rows.  The cursors are built from an indexed ordering
+    column plus the id, so they stay stable when rows are added.
+
+    Old 'start' offsets still work, for links out in the wild; the
+    page they land on links onward with cursors.
+
+    Has the same per_page, toggle, prev and next attributes as
+    prev_next, except that prev and next are cursors (or None).  The
+    rows are in object_list.
+    """
+    def __init__(self, queryset, field, after=None, before=None,
+                 start=None, per_page=None):
+
+        if not per_page: self.per_page=25
+        else: self.per_page = int(per_page)
+
+        if self.per_page == 25: self.toggle = 100
+        else: self.toggle = 25
+
+        self.field = field
+        self._field_type = queryset.model._meta.get_field(
+            field).get_internal_type()
+
+        after = self._decode(after)
+        before = self._decode(before)
+        newest_first = ('-' + field, '-id')
+        oldest_first = (field, 'id')
+
+        if after:
+            value, id = after
+            queryset = queryset.filter(
+                Q(**{ field + '__lt' : value }) |
+                Q(**{ field : value, 'id__lt' : id })
+                ).order_by(*newest_first)
+        elif before:
+            value, id = before
+            queryset = queryset.filter(
+                Q(**{ field + '__gt' : value }) |
+                Q(**{ field : value, 'id__gt' : id })
+                ).order_by(*oldest_first)
+        else:
+            queryset = queryset.order_by(*newest_first)
+
+        if start and not (after or before):
+            start = int(start)
+        else:
+            start = 0
+
+        rows = list(queryset[start:start + self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if before:
+            rows.reverse()
+        self.object_list = rows
+
+        if before:
+            has_prev, has_next = more, True
+        else:
+            has_prev, has_next = bool(after or start), more
+
+        self.first = not has_prev
+        self.prev = self.next = None
+        if rows and has_prev:
+            self.prev = self._encode(rows[0])
+        if rows and has_next:
+            self.next = self._encode(rows[-1])
+
+    def _encode(self, row):
+        value = getattr(row, self.field)
+        if self._field_type == 'DateTimeField':
+            value = '%s%06d' % (value.strftime('%Y%m%d%H%M%S'),
+                                value.microsecond)
+        elif self._field_type == 'DateField':
+            value = value.strftime('%Y%m%d')
+        return '%s-%s' % (value, row.id)
+
+    def _decode(self, cursor):
+        """ Turn a cursor back into a (value, id) pair.  Mangled cursors
+        are treated as no cursor at all. """
+        if not cursor:
+            return None
+        try:
+            value, id = cursor.split('-')
+            id = int(id)
+            if self._field_type == 'DateTimeField':
+                value = datetime.datetime.strptime(
+                    value[:14], '%Y%m%d%H%M%S').replace(
+                    microsecond=int(value[14:] or 0))
+            elif self._field_type == 'DateField':
+                value = datetime.datetime.strptime(value, '%Y%m%d').date()
+            else:
+                value = int(value)
+        except ValueError:
+            return None
+        return value, id
+
+
+
 def unique(s):
     """Return a list of the elements in s, but without duplicates.
 
@@ -106,3 +214,21 @@ def unique(s):
 
 
     
+
+
+def parse_dates(values):
+    """ Like kungfutime.parse_times, for dates in any of the formats
+    Django's DateField takes. """
+    parsed = {}
+    for value in values:
+        if value in parsed:
+            continue
+        parsed[value] = None
+        for format in DEFAULT_DATE_INPUT_FORMATS:
+            try:
+                parsed[value] = datetime.date(
+                    *time.strptime(value, format)[:3])
+                break
+            except ValueError:
+                continue
+    return [parsed[value] for value in values]
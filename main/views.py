@@ -2,7 +2,10 @@
 
 from django.shortcuts import render_to_response
 from django.http import HttpResponse
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, Http404
+from django.core.servers.basehttp import FileWrapper
+from django.utils.cache import patch_response_headers, patch_vary_headers
+from django.views.decorators.http import condition
 from django.template import Context, loader
 from django.core.urlresolvers import reverse
 from django.core.exceptions import ObjectDoesNotExist
@@ -11,10 +14,12 @@ from django.contrib.auth.decorators import (login_required,
                                             user_passes_test, 
                                             permission_required)
 import datetime
+from django.utils import simplejson
 from bmc.settings import *
 from models import (Announcement, Newsbit, PublicWalk, IDSession,
                     User, UserProfile, WalkArea, Walk,
-                    Membership, Due)
+                    Membership, Due, BulkEmail, Job,
+                    MembershipStanding, MemberSearchTerm, RequestProfile)
 from django import forms
 from forms import (UserEditsUser, UserEditsProfile, 
                    UserEditsMembership, MembershipFetch,
@@ -23,9 +28,18 @@ from forms import (UserEditsUser, UserEditsProfile,
                    DueForm, MembershipStatus, MembershipSearch,
                    WalkFormAdmin)
 
+from django.conf import settings
 from django.core.mail import send_mail
-from smtplib import SMTPException
-from bmc.main.utilities import prev_next, unique
+from bmc.main.mailer import create_bulk_email
+from bmc.main.pictures import load_pictures
+from bmc.main.profiling import slowest_views
+from bmc.main.stylesheets import render_stylesheet
+from bmc.main.suspensions import set_memberships_active
+from bmc.main.jobs import enqueue, job_url, output_path
+from bmc.main.utilities import seek_page
+from bmc.main.caching import cache_public_page
+from bmc.main.calendar_feeds import (feed, feed_etag, feed_last_modified,
+                                     member_key, CONTENT_TYPES)
 from mushroom_admin import *
 
 """----------------------------------------------------------------
@@ -62,10 +76,11 @@ def halt(request, error=None):
 
 
 def style(request, sheet):
-    """ Returns a cascading stylesheet. """
-    template = sheet + '.css'
-    ctxt = { 'media_url' : MEDIA_URL, }
-    return render_to_response(template, ctxt, mimetype='text/css')
+    """ Returns a cascading stylesheet.  Only used until ./manage.py
+    build_css has been run (see main/stylesheets.py). """
+    response = HttpResponse(render_stylesheet(sheet), mimetype='text/css')
+    patch_response_headers(response, STYLESHEET_CACHE_TIMEOUT)
+    return response
 
 
 
@@ -73,11 +88,12 @@ def style(request, sheet):
                          Public Pages
 ----------------------------------------------------------------"""
 
+@cache_public_page(('announcements', 'newsbits'), PUBLIC_PAGE_CACHE_TIMEOUT)
 def index(request):
     """ Return our front page. """
     template = 'index.html'
     ctxt = {
-        'announcements' : Announcement.objects.all()[:5],
+        'announcements' : load_pictures(Announcement.objects.all()[:5]),
         'newsbits' : Newsbit.objects.all()[:3],
         'media_url' : MEDIA_URL,
         'request' : request,
@@ -112,6 +128,7 @@ def contact(request):
         }
     return render_to_response(template, ctxt)
 
+@cache_public_page(('walks', 'publicwalks', 'idsessions'), PUBLIC_PAGE_CACHE_TIMEOUT)
 def schedule(request):
     """ Displays the clubs schedule of activities. """
     template = 'schedule.html'
@@ -130,15 +147,8 @@ def schedule(request):
             user_profile = UserProfile.objects.get(
                 user=request.user.id
                 )
-            areas = user_profile.areas.all()
-
-            walks_in_area = []
-            for area in areas:
-                walks_in_area += Walk.objects.filter(
-                    areas=area,
-                    date__gte=datetime.date.today()
-                    )
-            walks_in_area=unique(walks_in_area)
+            walks_in_area = Walk.objects.upcoming_for_member(
+                user_profile, WALKS_IN_AREA_CACHE_TIMEOUT)
 
         except ObjectDoesNotExist:
             pass
@@ -153,14 +163,16 @@ def schedule(request):
         }
     return render_to_response(template, ctxt)
 
-def news_archive(request, start=None, per_page=None):
+@cache_public_page(('newsbits',), PUBLIC_PAGE_CACHE_TIMEOUT)
+def news_archive(request, start=None, per_page=None, after=None, 
+                 before=None):
     """ Return an archive of the news pages. """
 
     template = 'news_archive.html'
 
-    pn = prev_next(start, per_page)
-    newsbits = Newsbit.objects.all()[pn.start:pn.next]
-    if pn.per_page > len(newsbits): pn.next = 0
+    pn = seek_page(Newsbit.objects.all(), 'timestamp', 
+                   after, before, start, per_page)
+    newsbits = pn.object_list
 
     ctxt = {
         'newsbits' : newsbits,
@@ -172,14 +184,16 @@ def news_archive(request, start=None, per_page=None):
     return render_to_response(template, ctxt)
 
 
-def announcements_archive(request, start=None, per_page=None):
+@cache_public_page(('announcements',), PUBLIC_PAGE_CACHE_TIMEOUT)
+def announcements_archive(request, start=None, per_page=None, 
+                          after=None, before=None):
     """ Return an archive of the announcements/articles. """
 
     template = 'article_archive.html'
 
-    pn = prev_next(start, per_page)
-    announcements = Announcement.objects.all()[pn.start:pn.next]
-    if pn.per_page > len(announcements): pn.next = 0
+    pn = seek_page(Announcement.objects.all(), 'timestamp', 
+                   after, before, start, per_page)
+    announcements = load_pictures(pn.object_list)
 
     ctxt = {
         'announcements' : announcements,
@@ -204,12 +218,15 @@ def page(request, page):
 def story(request, year, month, day, time):
     """ Fetch a story page, identified by timestamp
     """
-    ts = year + "-" + month + "-" + day + " " + time
-
-    from django.core.exceptions import ObjectDoesNotExist
+    try:
+        ts = datetime.datetime.strptime(
+            '%s-%s-%s %s' % (year, month, day, time), '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        error = "We couldn't find a story with that timestamp."
+        return error_404(request, error)
 
     try: 
-        story = Announcement.objects.get(timestamp=ts)
+        story = Announcement.objects.get_by_permalink(ts)
         template = "story.html"
         ctxt = {
             'heading' : story.heading,
@@ -228,6 +245,52 @@ def story(request, year, month, day, time):
         return error_404(request, error)
 
 
+"""----------------------------------------------------------------
+                         Calendar Feeds
+----------------------------------------------------------------"""
+
+def calendar_members(request):
+    """ Whether a calendar feed request may see members-only walks:
+    it comes from a logged in member, or carries a member's key. """
+    if not hasattr(request, '_calendar_members'):
+        members = request.user.is_authenticated()
+        if not members and request.GET.get('key'):
+            try:
+                user = User.objects.get(id=int(request.GET.get('member')),
+                                        is_active=True)
+                members = request.GET['key'] == member_key(user)
+            except (TypeError, ValueError, ObjectDoesNotExist):
+                pass
+        request._calendar_members = members
+    return request._calendar_members
+
+def calendar_etag(request, format, area=None):
+    return feed_etag(format, area, calendar_members(request))
+
+def calendar_last_modified(request, format, area=None):
+    return feed_last_modified()
+
+@condition(calendar_etag, calendar_last_modified)
+def calendar_feed(request, format, area=None):
+    """ Upcoming walks and ID sessions as iCalendar or JSON, for
+    everything on the schedule or for one walk area. """
+    name = 'Boston Mycological Club'
+    if area is not None:
+        try:
+            area = WalkArea.objects.get(id=int(area))
+        except ObjectDoesNotExist:
+            raise Http404
+        name += ': %s' % area.name
+
+    members = calendar_members(request)
+    content = feed(format, name, request.get_host(), area, members)
+    response = HttpResponse(content, mimetype=CONTENT_TYPES[format])
+    patch_vary_headers(response, ('Cookie',))
+    if members:
+        response['Cache-Control'] = 'private'
+    return response
+
+
 """----------------------------------------------------------------
                          User Profile Tools
 ----------------------------------------------------------------"""
@@ -253,21 +316,14 @@ def profile(request):
             return error_404(request, error)
     
     # Pull up list of walks in the users' area
-    areas = user_profile.areas.all()
-    walks_in_area = []
-    for area in areas:
-        walks_in_area += Walk.objects.filter(
-            areas=area,
-            date__gte=datetime.date.today()
-            )
-
-    # Eliminate duplicate entries
-    walks_in_area=unique(walks_in_area)
+    walks_in_area = Walk.objects.upcoming_for_member(
+        user_profile, WALKS_IN_AREA_CACHE_TIMEOUT)
      
     template = 'profile.html'
     ctxt = { 
         'request' : request, 
         'walks_in_area' : walks_in_area,
+        'calendar_key' : member_key(user),
         'user' : user,
         'user_profile' : user_profile,
         'membership' : membership,
@@ -340,12 +396,13 @@ def edit_profile(request):
 ----------------------------------------------------------------"""
 
 @login_required(redirect_field_name='redirect_to')
-def list_walks(request, start=None, per_page=None):
+def list_walks(request, start=None, per_page=None, after=None, 
+               before=None):
     """ Lists all walks. """
 
-    pn = prev_next(start, per_page)
-    walk_list = Walk.objects.all()[pn.start:pn.next]
-    if pn.per_page > len(walk_list): pn.next = 0  
+    pn = seek_page(Walk.objects.all(), 'date', 
+                   after, before, start, per_page)
+    walk_list = pn.object_list
 
     template = 'walk_list.html'
     ctxt = { 
@@ -534,35 +591,28 @@ Note:  These tools need to get folded into generic "mushroom admin"
     lambda u: u.has_perm('u.is_superuser'),
     login_url = '/halt/')
 def list_memberships(request, start=None, per_page=None, 
-                     due_by=None, year=None, month=None):
+                     due_by=None, year=None, month=None,
+                     after=None, before=None):
     """ List all memberships, or all late memberships. """
 
-
-    pn = prev_next(start, per_page)
     if due_by:
         if month and year:
             due_by = datetime.date(int(year), int(month), 1)
         else:
             due_by = datetime.date.today()
             
-        members = Membership.objects.exclude(
-            due__paid_thru__gte=due_by,
-            ).exclude(
-                membership_type='honorary'
-                ).exclude(
-                    membership_type__startswith='corresponding'
-                    )[pn.start:pn.next]
-            
+        members = Membership.objects.with_roster().overdue(due_by)
+
     else:
-        members = Membership.objects.all()[pn.start:pn.next]
+        members = Membership.objects.with_roster()
         due_by = None
 
-    if pn.per_page > len(members): pn.next = 0  
+    pn = seek_page(members, 'join_date', after, before, start, per_page)
+    members = pn.object_list
     
     member_list = []
     for member in members:
-        users = User.objects.filter(
-            userprofile__membership=member.id)
+        users = [profile.user for profile in member.get_profiles()]
         mem_blob = { 'membership' : member, 'users' : users }
         member_list.append(mem_blob)
 
@@ -602,18 +652,14 @@ def view_membership(request, membership=None):
     edit_profile = UserProfileForm()
     edit_due = DueForm()
 
-    # is the membership active?  
-    active = False  # we assume not ...
-    for profile in user_profiles:
-        # ... but only one user needs to be active in order for
-        # the whole membership to be 'active' (this allows us to
-        # turn off one username without wiping the whole profile)
-        try:
-            if profile.user.is_active:
-                active = True            
-        except User.DoesNotExist:
-            pass
-
+    # Only one user needs to be active in order for the whole
+    # membership to be 'active' (this allows us to turn off one
+    # username without wiping the whole profile).  The standing
+    # tracks that for us.
+    try:
+        active = membership.standing.active
+    except ObjectDoesNotExist:
+        active = membership.is_active()
         
     template = 'view_membership.html'
     ctxt = {
@@ -806,7 +852,7 @@ def edit_user(request, membership, user=None):
                 message = loader.get_template(email_template)
                 message = message.render(Context(ctxt))
 
-                send_mail(subject, message, SERVER_EMAIL, 
+                send_mail(subject, message, settings.SERVER_EMAIL, 
                           [user.email], fail_silently=False,
                           )
 #                except:
@@ -874,18 +920,17 @@ def membership_status(request, membership, action):
     profiles = UserProfile.objects.filter(membership=membership)
 
     if request.method == 'POST':
-        for profile in profiles:
-            user = profile.user
-            form = MembershipStatus(request.POST, instance=user)
-            if form.is_valid():
-                form.save()
-            else:
-                error = """ The form you submitted isn't valid.
-                    Either you're trying to do hacky things to the
-                    site (solution: please stop), or there's an error
-                    in the code (solution: please get in touch with
-                    you system admin)."""
-                return error_404(request, error)
+        form = MembershipStatus(request.POST)
+        if form.is_valid():
+            set_memberships_active(
+                [membership.id], form.cleaned_data['is_active'])
+        else:
+            error = """ The form you submitted isn't valid.
+                Either you're trying to do hacky things to the
+                site (solution: please stop), or there's an error
+                in the code (solution: please get in touch with
+                you system admin)."""
+            return error_404(request, error)
 
         return HttpResponseRedirect(
             '/memberships/' + str(membership.id) + '/view/'
@@ -1043,23 +1088,24 @@ def view_dues(request, membership=None):
     lambda u: u.has_perm('u.is_superuser'),
     login_url = '/halt/')
 def membership_search(request):
+    """ Find memberships by name, email, address or membership id. """
     member_list = []
+    memberships = []
 
     if request.GET.has_key('last_name'):
         membership_search = MembershipSearch(request.GET)
         if membership_search.is_valid():
-            memberships = Membership.objects.filter(
-                userprofile__user__last_name__icontains=request.GET.__getitem__('last_name')
-                )[:25]
+            memberships = MemberSearchTerm.objects.search(
+                request.GET.__getitem__('last_name')
+                ).with_roster()[:25]
             if len(memberships) == 1:
                 return HttpResponseRedirect(
                     '/memberships/' + str(memberships[0].id) + '/view/'
                     )
                 
             for membership in memberships:
-                users = User.objects.filter(
-                    userprofile__membership=membership.id
-                    )
+                users = [profile.user
+                         for profile in membership.get_profiles()]
                 mem_blob = { 
                     'membership' : membership, 
                     'users' : users,
@@ -1077,6 +1123,33 @@ def membership_search(request):
         return render_to_response(template, ctxt)
             
 
+@user_passes_test(
+    lambda u: u.has_perm('u.is_superuser'),
+    login_url = '/halt/')
+def membership_suggest(request):
+    """ Type-ahead for the membership search box: a JSON list of up
+    to ten matching memberships. """
+    query = request.GET.get('q', '')
+    membership_ids = list(MemberSearchTerm.objects.search(
+            query).values_list('id', flat=True)[:10])
+
+    standings = MembershipStanding.objects.filter(
+        membership__in=membership_ids,
+        ).select_related('membership')
+
+    suggestions = []
+    for standing in standings:
+        suggestions.append({
+                'id' : standing.membership.id,
+                'label' : '%s: %s, %s' % (standing.anded_name_list,
+                                          standing.membership.address,
+                                          standing.membership.city),
+                'url' : '/memberships/%d/view/' % standing.membership.id,
+                })
+
+    return HttpResponse(simplejson.dumps(suggestions), 
+                        mimetype='application/json')
+
 @user_passes_test(
     lambda u: u.has_perm('u.is_superuser'),
     login_url = '/halt/')
@@ -1159,7 +1232,32 @@ def mushroom_admin(request):
 @user_passes_test(
     lambda u: u.has_perm('u.is_superuser'),
     login_url = '/halt/')
-def mushroom_admin_list(request, entries, start=None, per_page=None):
+def request_profiles(request):
+    """ The slowest views, and the slowest requests (for one view, if
+    asked), from what main/profiling.py recorded. """
+    view = request.GET.get('view', '')
+    slowest = RequestProfile.objects.order_by('-wall_time')
+    if view:
+        slowest = slowest.filter(view=view)
+
+    template = 'request_profiles.html'
+    ctxt = {
+        'request' : request,
+        'views' : slowest_views(),
+        'view' : view,
+        'slowest' : slowest[:25],
+        'recorded' : RequestProfile.objects.count(),
+        'profiling' : PROFILE_REQUESTS,
+        'page_name' : 'Slowest Views',
+        'media_url' : MEDIA_URL,
+        }
+    return render_to_response(template, ctxt)
+
+@user_passes_test(
+    lambda u: u.has_perm('u.is_superuser'),
+    login_url = '/halt/')
+def mushroom_admin_list(request, entries, start=None, per_page=None,
+                        after=None, before=None):
     """ List a series of entries for one model in the mushroom_admin
     page. """
 
@@ -1173,11 +1271,11 @@ def mushroom_admin_list(request, entries, start=None, per_page=None):
     model = entries.MODEL
     entry_name = entries.NAME
     template = entries.LIST_TEMPLATE
+    order_field = entries.ORDER_FIELD
 
-    pn = prev_next(start, per_page)
-
-    entries = model.objects.all()[pn.start:pn.next]
-    if pn.per_page > len(entries): pn.next = 0
+    pn = seek_page(model.objects.all(), order_field, 
+                   after, before, start, per_page)
+    entries = pn.object_list
 
     ctxt = {
         'entries' : entries,
@@ -1311,10 +1409,21 @@ def list_emails(request):
 @user_passes_test(
     lambda u: u.has_perm('u.is_superuser'),
     login_url = '/halt/')
-def sent_email(request, send_errors=None):
-    """ Return a page confirming a sent email """
+def sent_email(request, bulk_email=None):
+    """ Return a page confirming a sent email, listing any addresses
+    that failed. """
+    send_errors = []
+    if bulk_email:
+        try:
+            bulk_email = BulkEmail.objects.get(id=int(bulk_email))
+        except ObjectDoesNotExist:
+            error = "That email does not appear to exist."
+            return error_404(request, error)
+        send_errors = bulk_email.recipients.filter(status='failed')
+
     template = 'sent_email.html'
     ctxt = { 'request' : request,
+             'bulk_email' : bulk_email,
              'send_errors' : send_errors,
              'page_name' : 'Sent Email',
              'media_url' : MEDIA_URL,
@@ -1330,7 +1439,6 @@ def send_email(request, sent=None):
     form = EmailForm()
     template='send_email.html'
     users = []
-    send_errors = []
 
     if request.method == 'POST':
         form = EmailForm(request.POST)
@@ -1339,34 +1447,17 @@ def send_email(request, sent=None):
             subject = form['subject']
             message = form['message']
 
-            try:
-                users = User.objects.filter(
-                        is_active=True,
-                        userprofile__want_email=True,
-                        )
-            except ObjectDoesNotExist:
-                error = "Can't pull up the user list!"
-                return error_404(request, error)
-
-            for user in users:
-                try:
-                    user_email = user.email
-                    send_mail(subject, 
-                              message, 
-                              SERVER_EMAIL,
-                              [user_email],
-                              fail_silently=False,
-                              )
-                except SMTPException:
-                    # Need to grab Exception and pass it to template
-                    error = "There was an error sending mail!"
-                    return error_404(request, error)
-
-                except:
-                    error = "There was an error sending mail!"
-                    return error_404(request, error)
-
-            return HttpResponseRedirect(reverse(sent_email))
+            users = User.objects.filter(
+                is_active=True,
+                userprofile__want_email=True,
+                )
+
+            bulk_email = create_bulk_email(
+                subject, message, settings.SERVER_EMAIL, users)
+            job = enqueue('send_email', request.user,
+                          bulk_email=bulk_email.id)
+
+            return HttpResponseRedirect(job_url(job))
 
         else:
             form = EmailForm(request.POST)
@@ -1379,4 +1470,67 @@ def send_email(request, sent=None):
         'media_url' : MEDIA_URL,
         }
     return render_to_response(template, ctxt)
-        
+
+@user_passes_test(
+    lambda u: u.has_perm('u.is_superuser'),
+    login_url = '/halt/')
+def resume_email(request, bulk_email):
+    """ Finish sending an interrupted email, retrying any addresses
+    that failed. """
+    try:
+        bulk_email = BulkEmail.objects.get(id=int(bulk_email))
+    except ObjectDoesNotExist:
+        error = "That email does not appear to exist."
+        return error_404(request, error)
+
+    if request.method == 'POST':
+        job = enqueue('send_email', request.user,
+                      bulk_email=bulk_email.id, retry=True)
+        return HttpResponseRedirect(job_url(job))
+
+    return HttpResponseRedirect(
+        '/email/sent/' + str(bulk_email.id) + '/'
+        )
+
+
+"""----------------------------------------------------------------
+                         Background Jobs
+----------------------------------------------------------------"""
+
+@user_passes_test(
+    lambda u: u.has_perm('u.is_superuser'),
+    login_url = '/halt/')
+def job_status(request, job):
+    """ Show how a background job is getting along. """
+    try:
+        job = Job.objects.get(id=int(job))
+    except ObjectDoesNotExist:
+        error = "That job does not appear to exist."
+        return error_404(request, error)
+
+    template = 'job_status.html'
+    ctxt = {
+        'request' : request,
+        'job' : job,
+        'arguments' : job.get_arguments(),
+        'page_name' : 'Job Status',
+        'media_url' : MEDIA_URL,
+        }
+    return render_to_response(template, ctxt)
+
+@user_passes_test(
+    lambda u: u.has_perm('u.is_superuser'),
+    login_url = '/halt/')
+def job_output(request, job):
+    """ Download the file that a finished job wrote. """
+    try:
+        job = Job.objects.get(id=int(job), status='done')
+        output = open(output_path(job), 'rb')
+    except (ObjectDoesNotExist, IOError):
+        error = "That file does not appear to exist."
+        return error_404(request, error)
+
+    response = HttpResponse(FileWrapper(output), mimetype='text/csv')
+    response['Content-Disposition'] = 'attachment; filename=%s' % (
+        job.output)
+    return response
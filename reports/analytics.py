@@ -0,0 +1,92 @@
+""" Dues revenue totals for the treasurer.
+
+Everything is summed by the database with GROUP BY, a year at a time
+(or over all time), and the results are cached until the next due is
+saved or deleted.
+"""
+
+import datetime
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, Sum
+
+from bmc.settings import DUES_SUMMARY_CACHE_TIMEOUT
+from bmc.main.caching import make_key
+from bmc.main.models import Due
+from bmc.reports.export import format_line
+
+DUES_SUMMARY_HEADER = ('Period', 'Payments', 'Total')
+
+def dues_in(year=None):
+    """ Dues paid in the given year, or all dues. """
+    dues = Due.objects.all()
+    if year:
+        dues = dues.filter(
+            payment_date__gte=datetime.date(year, 1, 1),
+            payment_date__lt=datetime.date(year + 1, 1, 1),
+            )
+    return dues
+
+
+def revenue_by_month(year=None):
+    """ (year, month, payments, total) for each month with dues. """
+    qn = connection.ops.quote_name
+    column = '%s.%s' % (qn(Due._meta.db_table), qn('payment_date'))
+    rows = dues_in(year).extra(select={
+            'year' : connection.ops.date_extract_sql('year', column),
+            'month' : connection.ops.date_extract_sql('month', column),
+            }).values('year', 'month').annotate(
+        payments=Count('id'), total=Sum('payment_amount'),
+        ).order_by('year', 'month')
+    return [(int(row['year']), int(row['month']), row['payments'],
+             row['total']) for row in rows]
+
+
+def revenue_by(field, year=None):
+    """ (value, payments, total) for each value of a field of Due (or,
+    with __, of something related to it). """
+    rows = dues_in(year).values(field).annotate(
+        payments=Count('id'), total=Sum('payment_amount'),
+        ).order_by(field)
+    return [(row[field], row['payments'], row['total']) for row in rows]
+
+
+def dues_summary(year=None):
+    """ Everything on the dues summary page for a year (or all time),
+    from the cache if it's there. """
+    key = make_key('dues', 'summary', year or 'all')
+    summary = cache.get(key)
+    if summary is None:
+        by_month = revenue_by_month(year)
+        summary = {
+            'year' : year,
+            'years' : [day.year for day in
+                       Due.objects.dates('payment_date', 'year')],
+            'by_month' : [(datetime.date(y, m, 1), payments, total)
+                          for (y, m, payments, total) in by_month],
+            'by_payment_type' : revenue_by('payment_type', year),
+            'by_membership_type' : revenue_by(
+                'membership__membership_type', year),
+            'payments' : sum([row[2] for row in by_month]),
+            'total' : sum([row[3] for row in by_month]),
+            }
+        cache.set(key, summary, DUES_SUMMARY_CACHE_TIMEOUT)
+    return summary
+
+
+def dues_summary_lines(summary):
+    """ The dues summary as lines for a spreadsheet, in the format of
+    reports/export.py. """
+    yield format_line(DUES_SUMMARY_HEADER)
+    for (month, payments, total) in summary['by_month']:
+        yield format_line((month.strftime('%Y-%m'), payments, total))
+    yield format_line(('Total', summary['payments'], summary['total']))
+
+    for (title, rows) in (('Payment Type', summary['by_payment_type']),
+                          ('Membership Type',
+                           summary['by_membership_type'])):
+        yield '\n'
+        yield format_line((title, 'Payments', 'Total'))
+        for row in rows:
+            yield format_line(row)
@@ -0,0 +1,75 @@
+""" Streaming exports for the BMC reports.
+
+The old exports rendered the whole roster through a template, and
+every row went back to the database for its names, emails and most
+recent due.  Here we walk the memberships with their rosters loaded
+in bulk (see Membership.objects.with_roster), and yield the report
+one line at a time.
+"""
+
+from django.http import HttpResponse
+from django.utils.encoding import smart_str
+
+MEMBERSHIP_REPORT_HEADER = (
+    'Join Date', 'Name(s)', 'Email', 'Address', 'Address2', 'City',
+    'State', 'Zip', 'Paid Through', 'Membership Type',
+    )
+
+MAILING_LABEL_HEADER = (
+    'Name', 'Address', 'Address2', 'City', 'State', 'Zip',
+    )
+
+
+def format_line(values):
+    """ Join a row of values in the pipe delimited format that the
+    club's spreadsheets expect. """
+    return smart_str(' | '.join(
+        [value is not None and unicode(value) or '' for value in values]
+        )) + '\n'
+
+
+def paid_thru(membership):
+    """ Paid through date of the most recent due, if any. """
+    due = membership.get_most_recent_due()
+    if due == '--':
+        return None
+    return due.paid_thru
+
+
+def membership_report_lines(memberships):
+    """ Generate the membership report, one line at a time. """
+    yield format_line(MEMBERSHIP_REPORT_HEADER)
+
+    for membership in memberships.with_roster().iterator():
+        yield format_line((
+                membership.join_date,
+                membership.get_anded_name_list(),
+                membership.get_email_list(),
+                membership.address,
+                membership.address2,
+                membership.city,
+                membership.state,
+                membership.zip,
+                paid_thru(membership),
+                membership.membership_type,
+                ))
+
+
+def mailing_label_lines(memberships):
+    """ Generate mailing labels, one line at a time. """
+    yield format_line(MAILING_LABEL_HEADER)
+
+    for membership in memberships.with_roster().iterator():
+        yield format_line((
+                membership.get_anded_name_list(),
+                membership.address,
+                membership.address2,
+                membership.city,
+                membership.state,
+                membership.zip,
+                ))
+
+
+def csv_response(lines):
+    """ Stream a generated report back to the browser. """
+    return HttpResponse(lines, mimetype='text/csv')
@@ -3,6 +3,7 @@
 from datetime import date
 
 from django.shortcuts import render_to_response
+from django.http import HttpResponseRedirect
 from django.core.exceptions import ObjectDoesNotExist
 from django.views.generic import list_detail
 from django.contrib.auth.models import User
@@ -12,46 +13,26 @@ from django.contrib.auth.decorators import (login_required,
 
 from settings import MEDIA_URL
 from bmc.main.models import Membership, UserProfile, Due
+from bmc.main.jobs import enqueue, job_url
+from bmc.reports import analytics
+from bmc.reports.export import csv_response
 
 @user_passes_test(
     lambda u: u.has_perm('u.is_superuser'),
     login_url = '/halt/')
 def mailing_labels(request):
-    """ Outputs mailing labels
+    """ Queues up mailing labels for all active memberships; the job
+    status page links to the finished file.
 
     """
 
-    memberships = Membership.objects.all()
-
-    mem_blob = []
-
-    for membership in memberships:
-        active = False
-        info = {}
-        profiles = UserProfile.objects.filter(membership=membership.id)
-        for profile in profiles:
-            try:
-                if profile.user.is_active: 
-                    active = True
-                    break
-            except ObjectDoesNotExist:
-                break
-
-        if active:
-            info['profiles'] = profiles
-            info['membership'] = membership
-            mem_blob.append(info)
-        
-    template = 'mailing_labels.csv'
-    ctxt = { 
-        'request' : request,
-        'memberships' : memberships,
-        'mem_blob': mem_blob,
-        'media_url' : MEDIA_URL,        
-        }
-    return render_to_response(template, ctxt, mimetype='text/csv')
+    job = enqueue('mailing_labels', request.user)
+    return HttpResponseRedirect(job_url(job))
 
 
+@user_passes_test(
+    lambda u: u.has_perm('u.is_superuser'),
+    login_url = '/halt/')
 def due_report(request, page=1, template_name="reports_dues.html"):
     """ Get a report of dues, ordered by most recent first
     """
@@ -73,14 +54,34 @@ def due_report(request, page=1, template_name="reports_dues.html"):
     
     
 
-def membership_report(request, filter_by='active', page=1, format='html', 
-                      template_name="reports_memberships.html", 
-                      order_by='-join_date'):
-    """ List of memberships
+@user_passes_test(
+    lambda u: u.has_perm('u.is_superuser'),
+    login_url = '/halt/')
+def dues_summary(request, year=None, format=None,
+                 template_name="reports_dues_summary.html"):
+    """ Dues revenue by month, payment type and membership type, for a
+    year or for all time.
     """
+    if year:
+        year = int(year)
+    summary = analytics.dues_summary(year)
 
-    if format=='csv':
-        template_name = "reports_memberships.csv"
+    if format == 'csv':
+        return csv_response(analytics.dues_summary_lines(summary))
+
+    ctxt = {
+        'request' : request,
+        'summary' : summary,
+        'page_name' : 'Dues Summary',
+        'media_url' : MEDIA_URL,
+        }
+    return render_to_response(template_name, ctxt)
+
+
+def filter_memberships(filter_by='active'):
+    """ Memberships for the membership report.  filter_by is a list
+    of filters joined by '+' (e.g. 'active+due').
+    """
 
     memberships = Membership.objects.all()
 
@@ -88,8 +89,8 @@ def membership_report(request, filter_by='active', page=1, format='html',
 
     # Fetch active, suspended, or all memberships
     if 'inactive' in filter_list:
-        memberships = memberships.exclude(
-            userprofile__user__is_active=True,
+        memberships = memberships.filter(
+            standing__active=False,
             )
 
     elif 'all' in filter_list:
@@ -97,20 +98,14 @@ def membership_report(request, filter_by='active', page=1, format='html',
 
     else:
         memberships = memberships.filter(
-            userprofile__user__is_active=True,
+            standing__active=True,
             )
 
     if 'due' in filter_list:
         year = date.today().year
         due_by = date(int(year), 1, 1)
 
-        memberships = memberships.exclude(
-            due__paid_thru__gte=due_by,
-            ).exclude(
-                membership_type='Honorary',
-                ).exclude(
-                    membership_type='Corresponding'
-                    )
+        memberships = memberships.overdue(due_by)
 
     if 'corresponding' in filter_list:
         memberships = memberships.filter(
@@ -125,22 +120,33 @@ def membership_report(request, filter_by='active', page=1, format='html',
     if 'noemail' in filter_list:
         memberships = memberships.filter(
             userprofile__user__email="NoEmail@BostonMycologicalClub.org",
-            )
+            ).distinct()
         
-    memberships = memberships.order_by('-join_date').distinct()
+    memberships = memberships.order_by('-join_date')
+
+    return memberships
+
+
+@user_passes_test(
+    lambda u: u.has_perm('u.is_superuser'),
+    login_url = '/halt/')
+def membership_report(request, filter_by='active', page=1, format='html', 
+                      template_name="reports_memberships.html", 
+                      order_by='-join_date'):
+    """ List of memberships
+    """
+
+    memberships = filter_memberships(filter_by)
 
     if format=='csv':
-        template_name = 'reports_memberships.csv'
-        return render_to_response(
-            template_name, 
-            { 'membership_list': memberships,}, 
-            mimetype="text/csv"
-            )
+        job = enqueue('membership_report', request.user,
+                      filter_by=filter_by)
+        return HttpResponseRedirect(job_url(job))
 
     return list_detail.object_list(
         request,
         template_name=template_name,
-        queryset=memberships,
+        queryset=memberships.with_roster(),
         template_object_name='membership',
         paginate_by=100,
         page = page,
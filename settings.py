@@ -58,9 +58,11 @@ TEMPLATE_LOADERS = (
 )
 
 MIDDLEWARE_CLASSES = (
+    'bmc.main.profiling.ProfilingMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'bmc.main.backends.ClientAddressMiddleware',
     'django.middleware.doc.XViewMiddleware',
 )
 
@@ -68,7 +70,6 @@ AUTH_PROFILE_MODULE = 'main.UserProfile'
 
 AUTHENTICATION_BACKENDS = (
     'bmc.main.backends.EmailOrUsernameModelBackend',
-    'django.contrib.auth.backends.ModelBackend'
 )
 
 ROOT_URLCONF = 'bmc.urls'
@@ -112,6 +113,87 @@ MEMBERSHIP_TYPES = (
     ('Honorary', 'Honorary'),
     )
 
+# Membership types that don't pay dues, so are never overdue.
+DUES_EXEMPT_MEMBERSHIP_TYPES = ('Corresponding', 'Honorary')
+
+# Bulk email (see main/mailer.py): how many messages to send over one
+# SMTP connection, and how many seconds to wait between batches.
+BULK_EMAIL_BATCH_SIZE = 50
+BULK_EMAIL_BATCH_PAUSE = 0
+
+# Saving something bumps a generation number in the cache (see
+# main/caching.py), and the login throttle counts failures in it, so
+# every process that serves pages, runs jobs or runs commands has to
+# see the same cache.  The default, an in-memory cache in each process,
+# is only right for a single process (such as runserver).  Where the
+# site runs as several processes, set local_settings.py to use a
+# memcached:
+#CACHE_BACKEND = 'memcached://127.0.0.1:11211/'
+# (The database cache, db://, is shared too, but costs a query for
+# every lookup, which is more than most of the pages it would cache.)
+CACHE_BACKEND = 'locmem://'
+
+# How long to cache the public pages (front page, schedule, archives)
+# for visitors who aren't logged in (seconds).  Saving the things on
+# them clears the cache.
+PUBLIC_PAGE_CACHE_TIMEOUT = 60 * 60
+
+# How long to cache the lookup behind each story permalink (seconds).
+STORY_CACHE_TIMEOUT = 60 * 60 * 24
+
+# How long to cache the list of upcoming walks in a member's areas
+# (seconds).  Saving a walk clears it; 0 turns the cache off.
+WALKS_IN_AREA_CACHE_TIMEOUT = 60 * 60
+
+# How long to cache the dues revenue summaries (seconds).  Saving or
+# deleting a due clears them.
+DUES_SUMMARY_CACHE_TIMEOUT = 60 * 60 * 24
+
+# How long to cache the calendar feeds (seconds).  Changing a walk,
+# public walk or ID session clears them.
+CALENDAR_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Announcement pictures (see main/pictures.py): the boxes, in pixels,
+# that the smaller copies are made to fit, and their JPEG quality.
+PICTURE_SIZES = {
+    'thumb' : (150, 150),
+    'web' : (480, 480),
+    }
+PICTURE_QUALITY = 80
+
+# ./manage.py build_css writes the stylesheets, minified and named by
+# their contents, to this directory under MEDIA_ROOT, and records their
+# names in CSS_MANIFEST.  Until it's been run, they're rendered by
+# main.views.style.
+CSS_DIR = 'css'
+CSS_MANIFEST = os.path.join(os.path.dirname(__file__), 'css_manifest.json')
+# How long browsers may keep the unbuilt stylesheets (seconds).
+STYLESHEET_CACHE_TIMEOUT = 60 * 60
+
+# Where background jobs (see main/jobs.py) write their exports.  Keep
+# this out of MEDIA_ROOT; the exports have members' addresses in them.
+JOB_OUTPUT_DIR = os.path.join(os.path.dirname(__file__), 'job_output')
+# A job still marked running after this many seconds is taken to have
+# lost its worker, and is marked failed.
+JOB_TIMEOUT = 60 * 60 * 6
+
+# After this many failed logins for a username or address from one
+# client address, further attempts from there are turned away without
+# checking the password until LOGIN_FAILURE_TIMEOUT seconds have passed
+# since the last failure.  (Needs bmc.main.backends.ClientAddressMiddleware
+# in MIDDLEWARE_CLASSES; without it every client counts as one.)
+LOGIN_FAILURE_LIMIT = 10
+LOGIN_FAILURE_TIMEOUT = 60 * 15
+
+# main/profiling.py records how long each request took, and the
+# slowest views are listed at /mushroom_admin/profiles/.  It's off
+# unless PROFILE_REQUESTS is set to True (in local_settings.py); then it
+# keeps the PROFILE_KEEP most recent profiles, and doesn't record
+# requests faster than PROFILE_MIN_TIME milliseconds.
+PROFILE_REQUESTS = False
+PROFILE_KEEP = 10000
+PROFILE_MIN_TIME = 250
+
 # local_settings.py can be used to override environment-specific settings
 # like database and email that differ between development and production.
 try:
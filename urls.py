@@ -10,18 +10,18 @@ urlpatterns = patterns('',
     (r'^$', index),
 
     # Misc Pages
-    (r'^news/(start(?P<start>[0-9]+)/)?((?P<per_page>[0-9]+)pp/)?', news_archive),
-    (r'^articles/(start(?P<start>[0-9]+)/)?((?P<per_page>[0-9]+)pp/)?', announcements_archive),
+    (r'^news/(start(?P<start>[0-9]+)/|after(?P<after>[0-9]+-[0-9]+)/|before(?P<before>[0-9]+-[0-9]+)/)?((?P<per_page>[0-9]+)pp/)?', news_archive),
+    (r'^articles/(start(?P<start>[0-9]+)/|after(?P<after>[0-9]+-[0-9]+)/|before(?P<before>[0-9]+-[0-9]+)/)?((?P<per_page>[0-9]+)pp/)?', announcements_archive),
 
     # Walks
-    (r'^walks/list/(start(?P<start>[0-9]+)/)?((?P<per_page>[0-9]+)pp/)?', list_walks),
+    (r'^walks/list/(start(?P<start>[0-9]+)/|after(?P<after>[0-9]+-[0-9]+)/|before(?P<before>[0-9]+-[0-9]+)/)?((?P<per_page>[0-9]+)pp/)?', list_walks),
     (r'^walks/create/', create_walk),
     (r'^walks/edit/((?P<walk>[0-9]+)/)?', edit_walk),
     (r'^walks/view/((?P<walk>[0-9]+)/)?', view_walk),
     (r'^walks/mushrooms/((?P<walk>[0-9]+)/)?', mushrooms),
 
     #Membership Tools
-    (r'^memberships/list/(start(?P<start>[0-9]+)/)?((?P<per_page>[0-9]+)pp/)?((?P<due_by>due_by)/((?P<year>[1-2][0-9][0-9][0-9])/(?P<month>([0-1])?[0-9])/)?)?', list_memberships),
+    (r'^memberships/list/(start(?P<start>[0-9]+)/|after(?P<after>[0-9]+-[0-9]+)/|before(?P<before>[0-9]+-[0-9]+)/)?((?P<per_page>[0-9]+)pp/)?((?P<due_by>due_by)/((?P<year>[1-2][0-9][0-9][0-9])/(?P<month>([0-1])?[0-9])/)?)?', list_memberships),
     url(r'^memberships/(?P<membership>[0-9]+)/view/', view_membership, name="membership_view"),
     (r'^memberships/((?P<membership>[0-9]+)/)?edit/', edit_membership ),
     (r'^memberships/create/', create_membership ),
@@ -29,6 +29,7 @@ urlpatterns = patterns('',
     (r'^memberships/(?P<membership>[0-9]+)/status/(?P<action>suspend|restore)/', membership_status),
     (r'^memberships/((?P<membership>[0-9]+)/)?edit_due/((?P<due>[0-9]+)/)?', edit_due),
     (r'^memberships/((?P<membership>[0-9]+)/)?dues/', view_dues),
+    (r'^memberships/search/suggest/', membership_suggest),
     (r'^memberships/search/', membership_search),
     (r'^memberships/fetch/', membership_fetch),
 
@@ -36,8 +37,11 @@ urlpatterns = patterns('',
     url(r'^memberships/membership_report/filter_(?P<filter_by>[-\w\+]+)/order_(?P<order_by>[-\w]+)/page_(?P<page>[0-9]+)', membership_report, name="reports_membership"),
     url(r'^memberships/membership_report/filter_(?P<filter_by>[-\w\+]+)/(?P<format>csv)', membership_report, name="reports_membership_csv"),
     url(r'^memberships/due_report/page_(?P<page>[0-9]+)', due_report, name="reports_dues"),
+    url(r'^memberships/due_report/summary/((?P<year>[0-9]{4})/)?((?P<format>csv)/)?$', dues_summary, name="reports_dues_summary"),
 
     # 'Static' Pages
+    (r'^calendar\.(?P<format>ics|json)$', calendar_feed),
+    (r'^calendar/area/(?P<area>[0-9]+)\.(?P<format>ics|json)$', calendar_feed),
     (r'^schedule', schedule),
     (r'^ClubActivities\.html$', schedule),  # legacy compatibility
     (r'^about', about),
@@ -50,15 +54,19 @@ urlpatterns = patterns('',
     (r'^([a-z0-9\-]+)\.css$', style),
 
     # Admin Stuff
+    (r'^mushroom_admin/profiles/', request_profiles),
     (r'^mushroom_admin/(?P<entries>[a-z]+)/((?P<entry_id>[0-9]+)/)?(edit|create)/', mushroom_admin_edit),
     (r'^mushroom_admin/(?P<entries>[a-z]+)/(?P<entry_id>[0-9]+)/', mushroom_admin_view),
-    (r'^mushroom_admin/(?P<entries>[a-z]+)/(start(?P<start>[0-9]+)/)?((?P<per_page>[0-9]+)pp/)?', mushroom_admin_list),
+    (r'^mushroom_admin/(?P<entries>[a-z]+)/(start(?P<start>[0-9]+)/|after(?P<after>[0-9]+-[0-9]+)/|before(?P<before>[0-9]+-[0-9]+)/)?((?P<per_page>[0-9]+)pp/)?', mushroom_admin_list),
     (r'^mushroom_admin/mailing_labels\.csv', mailing_labels),
     (r'^mushroom_admin', mushroom_admin),
 
     (r'^email/list/', list_emails),
     (r'^email/send/', send_email),
-    (r'^email/sent/', sent_email),
+    (r'^email/sent/((?P<bulk_email>[0-9]+)/)?', sent_email),
+    (r'^email/resume/(?P<bulk_email>[0-9]+)/', resume_email),
+    (r'^jobs/(?P<job>[0-9]+)/output/', job_output),
+    (r'^jobs/(?P<job>[0-9]+)/', job_status),
     (r'^admin/(.*)', admin.site.root),
 
     # Finger wagging 'you don't have permission' page